@@ -0,0 +1,143 @@
+import sys
+import time
+import json
+import threading
+import importlib.util
+import os.path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Compares the export-based existing-page scan of "Sync Public Videos.py" with the
+# per-page scan, against a local server imitating BookStack. Nothing is sent to the
+# real BookStack or YouTube.
+#
+# Usage: python "Benchmark Page Scan.py" [delay_seconds]
+#   delay_seconds  Politeness delay between requests (default: API_DELAY_SECONDS of the sync
+#                  script). The per-page scan waits this long once per page, so at the default
+#                  of 0.5s the three book sizes below take about 4.5 minutes.
+
+# --- Configuration --- #
+SYNC_SCRIPT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Sync Public Videos.py')
+BENCHMARK_BOOK_SIZES = [25, 100, 400] # Synthetic book sizes (pages), 50 pages per chapter
+# --------------------- #
+
+
+def load_sync_script():
+    """Imports the sync script as a module (its file name is not a valid module name)."""
+    spec = importlib.util.spec_from_file_location('sync_public_videos', SYNC_SCRIPT_FILE)
+    sync_script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sync_script)
+    return sync_script
+
+
+def start_benchmark_bookstack_server(sync_script, page_count):
+    """
+    Starts a local HTTP server that imitates the BookStack endpoints used by the
+    existing-page scan (book contents, page read, book HTML export) for a synthetic
+    book of page_count video pages, 50 pages per chapter.
+    Returns: The running server (call shutdown() when done).
+    """
+    page_html = {}
+    contents = []
+    for index in range(page_count):
+        page_id = index + 1
+        video_data = {
+            'id': f"bench{index:06d}",
+            'snippet': {
+                'title': f"Benchmark Video {index}",
+                'description': "Benchmark description line.\n" * 20,
+                'publishedAt': "2024-01-01T00:00:00Z",
+                'channelTitle': "Benchmark Channel",
+            },
+        }
+        page_html[page_id] = sync_script.build_bookstack_page_payload(video_data, 1)[1]['html']
+
+        if index % 50 == 0:
+            contents.append({'id': page_count + len(contents) + 1, 'name': f"Chapter {len(contents)}", 'type': 'chapter', 'pages': []})
+        contents[-1]['pages'].append({'id': page_id, 'name': f"Benchmark Video {index}", 'type': 'page'})
+
+    class BenchmarkRequestHandler(BaseHTTPRequestHandler):
+        def send_body(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/api/books/1':
+                self.send_body(json.dumps({'id': 1, 'contents': contents}).encode('utf-8'), 'application/json')
+            elif path == '/api/books/1/export/html':
+                parts = ['<!doctype html><html><body><h1>Benchmark Book</h1>']
+                for chapter in contents:
+                    parts.append(f'<h1 id="chapter-{chapter["id"]}">{chapter["name"]}</h1>')
+                    for page in chapter['pages']:
+                        parts.append(f'<div class="page-break"></div><h1 id="page-{page["id"]}">{page["name"]}</h1>{page_html[page["id"]]}')
+                parts.append('</body></html>')
+                self.send_body(''.join(parts).encode('utf-8'), 'text/html')
+            elif path.startswith('/api/pages/') and int(path.rsplit('/', 1)[1]) in page_html:
+                page_id = int(path.rsplit('/', 1)[1])
+                self.send_body(json.dumps({'id': page_id, 'html': page_html[page_id]}).encode('utf-8'), 'application/json')
+            else:
+                self.send_response(404)
+                self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BenchmarkRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_page_scan_benchmark(delay_seconds=None):
+    """
+    Times the export-based page scan against the per-page scan on synthetic books
+    of BENCHMARK_BOOK_SIZES pages, served locally. The politeness delay applies as in
+    a real run, so the per-page timings include it.
+    """
+    sync_script = load_sync_script()
+    if delay_seconds is not None:
+        sync_script.API_DELAY_SECONDS = delay_seconds
+    results = []
+
+    print("--- Existing-Page Scan Benchmark ---")
+    print(f"Politeness delay: {sync_script.API_DELAY_SECONDS}s per request "
+          f"(the per-page scans wait about {sum(BENCHMARK_BOOK_SIZES) * sync_script.API_DELAY_SECONDS:.0f}s in total).")
+    for page_count in BENCHMARK_BOOK_SIZES:
+        server = start_benchmark_bookstack_server(sync_script, page_count)
+        # The scans read BOOKSTACK_URL from the imported script, which only lives in this process
+        sync_script.BOOKSTACK_URL = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            print(f"\n-> Book with {page_count} pages: export scan")
+            start_time = time.perf_counter()
+            export_map = sync_script.get_existing_page_details(1, use_export_scan=True)
+            export_seconds = time.perf_counter() - start_time
+
+            print(f"-> Book with {page_count} pages: per-page scan")
+            start_time = time.perf_counter()
+            per_page_map = sync_script.get_existing_page_details(1, use_export_scan=False)
+            per_page_seconds = time.perf_counter() - start_time
+        finally:
+            server.shutdown()
+
+        results.append((page_count, export_seconds, per_page_seconds, export_map == per_page_map))
+
+    print(f"\n--- Benchmark Results (delay {sync_script.API_DELAY_SECONDS}s) ---")
+    print(f"{'Pages':>7} {'Export scan (s)':>16} {'Per-page scan (s)':>18} {'Speed-up':>9} {'Same result':>12}")
+    for page_count, export_seconds, per_page_seconds, same_result in results:
+        print(f"{page_count:>7} {export_seconds:>16.2f} {per_page_seconds:>18.2f} "
+              f"{per_page_seconds / max(export_seconds, 1e-9):>8.1f}x {'yes' if same_result else 'NO':>12}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        try:
+            delay_seconds = float(sys.argv[1])
+        except ValueError:
+            print('Usage: python "Benchmark Page Scan.py" [delay_seconds]')
+            sys.exit(1)
+    else:
+        delay_seconds = None
+    run_page_scan_benchmark(delay_seconds)
@@ -10,6 +10,22 @@ from googleapiclient.discovery import build
 from requests.adapters import HTTPAdapter, Retry
 from urllib.parse import urlparse
 import re 
+import bisect # Used by the page ordering sync
+import hmac # Used to verify WebSub notification signatures
+import hashlib
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from html.parser import HTMLParser # Used to stream-parse book exports
+import sqlite3 # Used for the run history database
+import statistics
+import gzip # Used for the local YouTube metadata mirror
+import fcntl # Used for the single-instance sync lock
+import socket
+import html # Used to clean and escape caption text
+import concurrent.futures # Used to fetch transcripts in parallel
 # --- NEW OAUTH IMPORTS ---
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -50,6 +66,8 @@ PURGE_SCRIPT_PATH = "./purge_recycle_bin.sh"
 CLIENT_SECRET_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
 SCOPES = ['https://www.googleapis.com/auth/youtube.readonly'] 
+# Additionally requested when SYNC_TRANSCRIPTS is enabled (needed to download captions)
+TRANSCRIPT_SCOPE = 'https://www.googleapis.com/auth/youtube.force-ssl'
 # -----------------------------
 
 # Sync Parameters
@@ -59,10 +77,81 @@ API_DELAY_SECONDS = 0.5 # Delay between BookStack API calls to prevent flooding
 # NEW CONFIG: Control whether to append the YouTube ID to the page title
 APPEND_YOUTUBE_ID_TO_TITLE = False 
 
+# Tag added to every synced page so a single video's page can be found without scanning the book
+YOUTUBE_VIDEO_ID_TAG = "youtube_video_id"
+# Tag identifying the playlist a chapter mirrors, so renamed playlists keep their chapter
+YOUTUBE_PLAYLIST_ID_TAG = "youtube_playlist_id"
+
 # CRITICAL: If True, all existing pages and chapters in TARGET_BOOK_ID will be deleted before re-syncing.
 # NOTE: Pages deleted during FORCE_RESYNC will now be permanently deleted (hard_delete=true).
 FORCE_RESYNC = True 
 
+# If True, each chapter's page order is kept in step with its playlist's order.
+# Only the pages that are out of place get a new priority.
+SYNC_PAGE_ORDER = True
+PAGE_PRIORITY_STEP = 1024 # Spacing between the priorities of newly created pages, leaving room for later moves
+
+# Existing-page discovery: read the whole book through one HTML export request instead of
+# one request per page. Pages the export does not cover are still fetched individually.
+USE_BOOK_EXPORT_SCAN = True
+BOOK_EXPORT_TIMEOUT_SECONDS = 300 # Large books can take a while to export
+
+# Caption / Transcript Ingestion
+# Adds each video's captions to its page as timestamped text so BookStack search can find
+# videos by what is said in them. Downloading captions needs the youtube.force-ssl scope (you will
+# be asked to log in again) and only works for videos on your own channel. Quota cost is high:
+# captions.list is 50 units per video and captions.download 200 (the default daily quota is 10,000).
+# Transcripts are cached with their caption etag: a cached transcript is trusted without any API
+# call until it is due for a re-check, and only downloaded again when the etag has changed.
+SYNC_TRANSCRIPTS = False
+TRANSCRIPT_CACHE_DIR = 'transcript_cache'
+TRANSCRIPT_RECHECK_HOURS = 168 # Hours before a cached transcript's caption track is checked for changes again
+TRANSCRIPT_MAX_CHECKS_PER_RUN = 40 # Caption checks per run (each 50 units, plus 200 per changed track)
+TRANSCRIPT_LANGUAGES = ['en'] # Preferred caption languages, in order; other languages are used if none match
+TRANSCRIPT_WORKERS = 4 # Transcripts fetched in parallel
+TRANSCRIPT_WAIT_SECONDS = 60 # Longest the update pass waits for a transcript; pages not updated in time are updated next run
+TRANSCRIPT_PARAGRAPH_SECONDS = 30 # Captions are grouped into timestamped paragraphs of about this length
+
+# Overlapping-Run Protection
+# Only one sync runs at a time. A run that starts while another is in progress records a
+# "dirty" flag and exits; the active run then does a follow-up cycle before releasing the lock.
+SYNC_LOCK_FILE = 'sync.lock'
+SYNC_DIRTY_FILE = 'sync.dirty'
+SYNC_MAX_FOLLOW_UP_CYCLES = 1 # Follow-up cycles the active run does for requests made while it ran
+SYNC_LOCK_WARN_HOURS = 6 # Warn if a running sync has held the lock longer than this
+
+# Run History Settings
+# Every run_sync() adds a record (phase timings, request counts, items, errors) to this database.
+# `python "Sync Public Videos.py" history` shows the trend and flags slow runs.
+RUN_HISTORY_DB = 'sync_history.sqlite3'
+HISTORY_BASELINE_RUNS = 10 # Number of previous runs forming the rolling baseline
+HISTORY_REGRESSION_FACTOR = 2.0 # Flag runs whose per-item cost exceeds the baseline by this factor
+
+# Incremental Fetch Settings
+# The uploads feed is ordered newest first, so normal runs stop paginating once they reach the
+# newest video synced last time (the "watermark"). A full walk of the uploads feed still runs on
+# the slower cadence below to catch deletions and privacy changes.
+SYNC_STATE_FILE = 'sync_state.json' # Stores the uploads watermark between runs
+FULL_INVENTORY_INTERVAL_HOURS = 24 # Hours between full uploads inventory walks
+
+# Local YouTube Metadata Mirror
+# Channel, playlist, membership and video metadata are kept in a local snapshot that each run
+# updates. `python "Sync Public Videos.py" sync-from-mirror` builds BookStack content from it
+# without any YouTube calls (new template, second BookStack instance, disaster recovery).
+MAINTAIN_YOUTUBE_MIRROR = True
+YOUTUBE_MIRROR_FILE = 'youtube_mirror.jsonl.gz'
+MIRROR_SNIPPET_FIELDS = ['title', 'description', 'publishedAt', 'channelTitle', 'tags']
+
+# WebSub (PubSubHubbub) Push Notification Settings
+# Used by `python "Sync Public Videos.py" websub`, which syncs single videos as YouTube announces them.
+WEBSUB_HUB_URL = "https://pubsubhubbub.appspot.com/subscribe" # Point at a local fake hub for testing
+WEBSUB_CALLBACK_URL = "" # Public URL the hub will POST notifications to (must reach the listener below)
+WEBSUB_LISTEN_HOST = "0.0.0.0"
+WEBSUB_LISTEN_PORT = 8085
+WEBSUB_SECRET = "" # Shared secret (required by the receiver); unsigned/mis-signed notifications are ignored
+WEBSUB_LEASE_SECONDS = 432000 # Subscription lease (5 days); renewed automatically before it expires
+WEBSUB_DEBOUNCE_SECONDS = 30 # Notifications arriving within this window are synced together
+
 
 # --- GLOBAL SETUP ---
 
@@ -75,15 +164,31 @@ BOOKSTACK_HEADERS = {
 }
 
 # --- OAUTH AUTHENTICATION FUNCTION ---
-def get_authenticated_service():
-    """Initializes the YouTube API service using OAuth2 credentials."""
+def get_required_scopes():
+    """Returns the OAuth scopes needed by the enabled features."""
+    if SYNC_TRANSCRIPTS:
+        return SCOPES + [TRANSCRIPT_SCOPE]
+    return SCOPES
+
+def get_authenticated_credentials():
+    """Loads, refreshes or interactively obtains the OAuth2 credentials (cached after the first call)."""
+    global YOUTUBE_CREDENTIALS
+    if YOUTUBE_CREDENTIALS is not None:
+        return YOUTUBE_CREDENTIALS
+
     creds = None
+    required_scopes = get_required_scopes()
     
     # 1. Load existing token if available
     if os.path.exists(TOKEN_FILE):
         with open(TOKEN_FILE, 'rb') as token:
             creds = pickle.load(token)
 
+    # A token saved before a feature needing more scopes was enabled must be replaced
+    if creds and not creds.has_scopes(required_scopes):
+        print("Saved token does not cover the required scopes. A new login is needed.")
+        creds = None
+
     # 2. Handle token refresh or initial interactive flow
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -94,7 +199,7 @@ def get_authenticated_service():
             # Token missing or refresh failed, start interactive flow
             print("Starting interactive OAuth flow. A browser window will open...")
             flow = InstalledAppFlow.from_client_secrets_file(
-                CLIENT_SECRET_FILE, SCOPES)
+                CLIENT_SECRET_FILE, required_scopes)
             creds = flow.run_local_server(port=0)
 
         # 3. Save the new/refreshed credentials
@@ -102,15 +207,98 @@ def get_authenticated_service():
             print(f"Saving new token to {TOKEN_FILE}")
             pickle.dump(creds, token)
 
-    # 4. Initialize and return the authenticated service
-    return build('youtube', 'v3', credentials=creds)
+    YOUTUBE_CREDENTIALS = creds
+    return creds
+
+def get_authenticated_service():
+    """Initializes the YouTube API service using OAuth2 credentials."""
+    return build('youtube', 'v3', credentials=get_authenticated_credentials())
+
+# YouTube API client, initialized with OAuth on first use so that runs which
+# make no YouTube calls (e.g. rebuilding from the local mirror) need no login
+YOUTUBE_SERVICE = None
+YOUTUBE_CREDENTIALS = None
 
-# Initialize YouTube API client using OAuth
-YOUTUBE_SERVICE = get_authenticated_service()
+def get_youtube_service():
+    """Returns the YouTube API client, authenticating on the first call."""
+    global YOUTUBE_SERVICE
+    if YOUTUBE_SERVICE is None:
+        YOUTUBE_SERVICE = get_authenticated_service()
+    return YOUTUBE_SERVICE
 
 # Regex to find the YouTube ID in the saved page content's iframe embed URL
 YOUTUBE_EMBED_REGEX = re.compile(r'youtube\.com/embed/([a-zA-Z0-9_-]{11})')
 
+# Regex for the heading id BookStack puts before each page in a book HTML export
+EXPORT_PAGE_HEADING_REGEX = re.compile(r'page-(\d+)')
+
+
+# --- RUN METRICS ---
+class RunMetrics:
+    """
+    Collects timing and request statistics for one sync run: wall time per phase,
+    request counts and time per API endpoint, items processed and errors.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phase_seconds = {}
+        self.request_counts = {}
+        self.request_seconds = {'bookstack': 0.0, 'youtube': 0.0}
+        self.counters = {}
+        self.items_processed = 0
+        self.error_count = 0
+
+        self.current_phase = None
+        self.phase_start = None
+        # Transcripts are fetched from worker threads
+        self.lock = threading.Lock()
+
+    def begin_phase(self, name):
+        """Ends the current phase (if any) and starts timing the named one."""
+        self.end_phase()
+        self.current_phase = name
+        self.phase_start = time.perf_counter()
+
+    def end_phase(self):
+        if self.current_phase is not None:
+            elapsed = time.perf_counter() - self.phase_start
+            self.phase_seconds[self.current_phase] = self.phase_seconds.get(self.current_phase, 0.0) + elapsed
+            self.current_phase = None
+
+    def record_request(self, service, endpoint, seconds, failed=False):
+        key = f"{service} {endpoint}"
+        with self.lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+            self.request_seconds[service] += seconds
+            if failed:
+                self.error_count += 1
+
+# Metrics for the run in progress; replaced at the start of every run_sync()
+RUN_METRICS = RunMetrics()
+
+def record_bookstack_response(response, *args, **kwargs):
+    """requests response hook counting every BookStack call by method and endpoint."""
+    # Numeric IDs are collapsed so e.g. all page reads count as one endpoint
+    endpoint = re.sub(r'/\d+', '/{id}', urlparse(response.request.url).path)
+    RUN_METRICS.record_request(
+        'bookstack',
+        f"{response.request.method} {endpoint}",
+        response.elapsed.total_seconds(),
+        failed=response.status_code >= 400
+    )
+
+def execute_youtube_request(youtube_request):
+    """Executes a YouTube API request, recording it in the run metrics."""
+    request_start = time.perf_counter()
+    try:
+        response = youtube_request.execute()
+    except Exception:
+        RUN_METRICS.record_request('youtube', youtube_request.methodId, time.perf_counter() - request_start, failed=True)
+        raise
+    RUN_METRICS.record_request('youtube', youtube_request.methodId, time.perf_counter() - request_start)
+    return response
+
 
 # --- UTILITY FUNCTIONS ---
 def create_bookstack_session():
@@ -120,8 +308,49 @@ def create_bookstack_session():
     adapter = HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=1)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    session.hooks['response'].append(record_bookstack_response)
     return session
 
+def load_sync_state():
+    """
+    Loads the persisted sync state (uploads watermark, last full inventory time).
+    Returns: A dictionary; empty if no state has been saved yet or the file is unreadable.
+    """
+    if not os.path.exists(SYNC_STATE_FILE):
+        return {}
+    try:
+        with open(SYNC_STATE_FILE, 'r') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Could not read sync state from {SYNC_STATE_FILE} ({e}). A full inventory will be performed.")
+        return {}
+
+def save_sync_state(sync_state):
+    """
+    Writes the sync state to disk. A temporary file is used so an interrupted
+    write never leaves a truncated state file behind.
+    """
+    temp_path = f"{SYNC_STATE_FILE}.tmp"
+    try:
+        with open(temp_path, 'w') as state_file:
+            json.dump(sync_state, state_file, indent=2)
+        os.replace(temp_path, SYNC_STATE_FILE)
+    except OSError as e:
+        print(f"WARNING: Could not save sync state to {SYNC_STATE_FILE}: {e}")
+
+def is_full_inventory_due(sync_state):
+    """
+    Decides whether this run must walk the entire uploads feed instead of
+    stopping at the watermark.
+    """
+    if FORCE_RESYNC:
+        # Every page is recreated, so the complete inventory is required
+        return True
+    if not sync_state.get('uploads_watermark'):
+        return True
+    last_full_inventory = sync_state.get('last_full_inventory', 0)
+    return time.time() - last_full_inventory >= FULL_INVENTORY_INTERVAL_HOURS * 3600
+
 def extract_items_from_structure(structure, item_type='page'):
     """
     Recursively extracts all items of a specific type (page or chapter)
@@ -170,13 +399,73 @@ def get_book_items_for_deletion(book_id):
         print(f"Error fetching page list for deletion: {e}")
         return [], []
 
+def search_tagged_chapters(book_id):
+    """
+    Finds the book's chapters carrying a playlist identity tag with a tag search
+    (search results include tags), paging through the results.
+    Returns: A dictionary {chapter_id: tags list, ...} or None if the search failed.
+    """
+    session = create_bookstack_session()
+    url_search = f"{BOOKSTACK_URL.rstrip('/')}/api/search"
+    tagged_chapters = {}
+    page = 1
+
+    while True:
+        try:
+            time.sleep(API_DELAY_SECONDS)
+            response = session.get(
+                url_search,
+                headers=BOOKSTACK_HEADERS,
+                params={'query': f"[{YOUTUBE_PLAYLIST_ID_TAG}] {{type:chapter}}", 'count': 100, 'page': page},
+                verify=False,
+                timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            results = response.json().get('data', [])
+        except requests.exceptions.RequestException as e:
+            print(f"  Error searching BookStack for tagged chapters: {e}")
+            return None
+
+        for result in results:
+            if result.get('type') == 'chapter' and result.get('book_id') == book_id:
+                tagged_chapters[result['id']] = result.get('tags', [])
+
+        if len(results) < 100:
+            return tagged_chapters
+        page += 1
+
+def get_chapter_tags(chapter_id):
+    """
+    Reads the tags of a single chapter.
+    Returns: The tags list, or None if the chapter could not be read.
+    """
+    session = create_bookstack_session()
+    try:
+        time.sleep(API_DELAY_SECONDS)
+        response = session.get(
+            f"{BOOKSTACK_URL.rstrip('/')}/api/chapters/{chapter_id}",
+            headers=BOOKSTACK_HEADERS,
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return response.json().get('tags', [])
+    except requests.exceptions.RequestException as e:
+        print(f"  FAILED to read tags for chapter ID {chapter_id}: {e}")
+        return None
+
 def get_existing_chapters(book_id):
     """
-    Fetches all existing chapters in the book.
-    Returns: A dictionary mapping {chapter_name: chapter_id, ...}
+    Fetches all existing chapters in the book along with their playlist identity tag.
+    Tags come from a single tag search; chapters are only read individually if
+    the search fails, since the book contents listing omits tags.
+    Returns: A tuple:
+             ({youtube_playlist_id: {'id': chapter_id, 'name': chapter_name, 'tags': tags}, ...},
+              {chapter_name: chapter_id, ...} for chapters without a playlist tag)
     """
     session = create_bookstack_session()
-    chapter_map = {}
+    chapters_by_playlist_id = {}
+    untagged_chapters_by_name = {}
     url_book_structure = f"{BOOKSTACK_URL.rstrip('/')}/api/books/{book_id}"
     
     try:
@@ -193,29 +482,58 @@ def get_existing_chapters(book_id):
         
         # Chapters are top-level items in contents
         chapters = [item for item in contents if item.get('type') == 'chapter']
-        
-        for chapter in chapters:
-            chapter_map[chapter['name']] = chapter['id']
             
     except requests.exceptions.RequestException as e:
         print(f"Error getting book structure to find chapters: {e}")
+        chapters = []
+
+    tagged_chapters = search_tagged_chapters(book_id) if chapters else {}
+    if tagged_chapters is None:
+        print("  Falling back to reading each chapter's tags individually.")
+
+    for chapter in chapters:
+        if tagged_chapters is None:
+            tags = get_chapter_tags(chapter['id']) or []
+        else:
+            tags = tagged_chapters.get(chapter['id'], [])
+
+        playlist_id = next((tag.get('value') for tag in tags if tag.get('name') == YOUTUBE_PLAYLIST_ID_TAG and tag.get('value')), None)
+        if playlist_id:
+            chapters_by_playlist_id[playlist_id] = {'id': chapter['id'], 'name': chapter['name'], 'tags': tags}
+        else:
+            untagged_chapters_by_name[chapter['name']] = chapter['id']
         
-    print(f"  Found {len(chapter_map)} existing BookStack chapters to check against.")
-    return chapter_map
+    print(f"  Found {len(chapters_by_playlist_id) + len(untagged_chapters_by_name)} existing BookStack chapters to check against "
+          f"({len(untagged_chapters_by_name)} without a playlist ID tag).")
+    return chapters_by_playlist_id, untagged_chapters_by_name
 
-def create_bookstack_chapter(book_id, chapter_name):
+def build_bookstack_chapter_payload(chapter_name, playlist_id=None, existing_tags=None):
     """
-    Creates a new chapter in BookStack.
-    Returns: The new chapter ID (integer) or None on failure.
+    Builds the name, description and playlist identity tag for a chapter.
+    Any existing tags are kept, since BookStack replaces the whole tag list on update.
     """
-    session = create_bookstack_session()
-    url = f"{BOOKSTACK_URL.rstrip('/')}/api/chapters"
-    
     payload = {
         'name': chapter_name,
-        'book_id': book_id,
         'description': f"Videos from YouTube playlist: {chapter_name}",
     }
+    if playlist_id:
+        payload['tags'] = [
+            {'name': tag['name'], 'value': tag.get('value', '')}
+            for tag in (existing_tags or []) if tag.get('name') != YOUTUBE_PLAYLIST_ID_TAG
+        ]
+        payload['tags'].append({'name': YOUTUBE_PLAYLIST_ID_TAG, 'value': playlist_id})
+    return payload
+
+def create_bookstack_chapter(book_id, chapter_name, playlist_id=None):
+    """
+    Creates a new chapter in BookStack, tagged with the playlist ID it mirrors.
+    Returns: The new chapter ID (integer) or None on failure.
+    """
+    session = create_bookstack_session()
+    url = f"{BOOKSTACK_URL.rstrip('/')}/api/chapters"
+    
+    payload = build_bookstack_chapter_payload(chapter_name, playlist_id)
+    payload['book_id'] = book_id
     
     print(f"  -> Creating new chapter: '{chapter_name}'")
 
@@ -241,6 +559,84 @@ def create_bookstack_chapter(book_id, chapter_name):
         print(f"  FAILED to create chapter '{chapter_name}'. HTTP Error {http_status}: {error_details}")
         return None
 
+def update_bookstack_chapter(chapter_id, chapter_name, playlist_id, existing_tags=None):
+    """
+    Renames a chapter and/or sets its playlist identity tag with a single PUT,
+    keeping its other tags. If existing_tags is not given, they are read first.
+    Returns: True on success.
+    """
+    session = create_bookstack_session()
+    url = f"{BOOKSTACK_URL.rstrip('/')}/api/chapters/{chapter_id}"
+
+    if existing_tags is None:
+        existing_tags = get_chapter_tags(chapter_id)
+        if existing_tags is None:
+            # Updating without the current tags would delete them
+            print(f"  Skipping update of chapter ID {chapter_id} ('{chapter_name}') because its tags could not be read.")
+            return False
+
+    try:
+        time.sleep(API_DELAY_SECONDS)
+        response = session.put(
+            url,
+            headers=BOOKSTACK_HEADERS,
+            json=build_bookstack_chapter_payload(chapter_name, playlist_id, existing_tags),
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return True
+
+    except requests.exceptions.RequestException as e:
+        http_status = e.response.status_code if e.response is not None else "Unknown"
+        error_details = e.response.text if e.response is not None else str(e)
+
+        print(f"  FAILED to update chapter ID {chapter_id} ('{chapter_name}'). HTTP Error {http_status}: {error_details}")
+        return False
+
+def resolve_playlist_chapters(book_id, playlists):
+    """
+    Matches each playlist to its chapter by playlist ID, so a renamed playlist
+    keeps its chapter (renamed with one PUT) instead of getting a new one.
+    Untagged chapters whose name matches a playlist title are adopted and tagged.
+    Returns: A tuple ({playlist_id: chapter_id, ...}, chapters created, chapters renamed)
+    """
+    chapters_by_playlist_id, untagged_chapters_by_name = get_existing_chapters(book_id)
+    chapter_sync_map = {}
+    chapters_created = 0
+    chapters_renamed = 0
+
+    for playlist in playlists:
+        p_id = playlist['playlist_id']
+        p_title = playlist['playlist_title']
+
+        if p_id in chapters_by_playlist_id:
+            chapter = chapters_by_playlist_id[p_id]
+            chapter_id = chapter['id']
+            if chapter['name'] != p_title:
+                print(f"  Playlist renamed: '{chapter['name']}' -> '{p_title}'. Renaming Chapter ID {chapter_id}.")
+                if update_bookstack_chapter(chapter_id, p_title, p_id, chapter['tags']):
+                    chapter['name'] = p_title
+                    chapters_renamed += 1
+            else:
+                print(f"  Found existing Chapter '{p_title}' (ID: {chapter_id}).")
+        elif p_title in untagged_chapters_by_name:
+            # Chapter created before playlist ID tags existed; tag it so future renames are tracked
+            chapter_id = untagged_chapters_by_name.pop(p_title)
+            print(f"  Found existing Chapter '{p_title}' (ID: {chapter_id}). Adding playlist ID tag.")
+            update_bookstack_chapter(chapter_id, p_title, p_id)
+            chapters_by_playlist_id[p_id] = {'id': chapter_id, 'name': p_title, 'tags': []}
+        else:
+            # Chapter does not exist, create it
+            chapter_id = create_bookstack_chapter(book_id, p_title, p_id)
+            if chapter_id:
+                chapters_created += 1
+                chapters_by_playlist_id[p_id] = {'id': chapter_id, 'name': p_title, 'tags': []}
+
+        chapter_sync_map[p_id] = chapter_id
+
+    return chapter_sync_map, chapters_created, chapters_renamed
+
 def delete_bookstack_item(item_id, item_type, item_title):
     """
     Deletes a page or chapter from BookStack.
@@ -294,12 +690,12 @@ def get_channel_uploads_playlist_id():
     print("-> Fetching Channel Uploads Playlist ID...")
     try:
         # Request for the channel details to get the uploads playlist ID
-        channels_request = YOUTUBE_SERVICE.channels().list(
+        channels_request = get_youtube_service().channels().list(
             id=YOUTUBE_CHANNEL_ID,
             part='contentDetails',
             maxResults=1
         )
-        channels_response = channels_request.execute()
+        channels_response = execute_youtube_request(channels_request)
         
         # The uploads playlist ID is nested in contentDetails
         uploads_playlist_id = channels_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
@@ -311,96 +707,118 @@ def get_channel_uploads_playlist_id():
         print(f"Error fetching channel uploads playlist ID: {e}")
         return None
 
-def fetch_all_videos_for_playlist(playlist_id, playlist_title):
+def fetch_all_videos_for_playlist(playlist_id, playlist_title, stop_at_watermark=None, fetch_errors=None):
     """
-    Helper function to paginate through all items in a given playlist 
+    Helper function to paginate through all items in a given playlist
     and fetch full video details for all items.
+
+    If stop_at_watermark ({'video_id': ..., 'published_at': ...}) is given, the playlist
+    is assumed to be ordered newest first (like the uploads feed) and pagination stops
+    as soon as the watermark video, or anything published before it, is reached.
+    If fetch_errors (a list) is given, a message is appended for each failed request,
+    since the returned list is then incomplete.
     Returns: list of video detail dictionaries.
     """
     current_playlist_video_ids = []
     next_video_token = None
-    
+    reached_watermark = False
+
     # 1. Collect all video IDs from the playlist
     while True:
         try:
-            playlist_items_request = YOUTUBE_SERVICE.playlistItems().list(
+            playlist_items_request = get_youtube_service().playlistItems().list(
                 playlistId=playlist_id,
                 part='contentDetails',
                 maxResults=50,
                 pageToken=next_video_token
             )
-            items_response = playlist_items_request.execute()
-            
-            current_playlist_video_ids.extend([
-                item['contentDetails']['videoId'] 
-                for item in items_response.get('items', []) 
-                if item.get('contentDetails', {}).get('videoId')
-            ])
-            
+            items_response = execute_youtube_request(playlist_items_request)
+
+            for item in items_response.get('items', []):
+                content_details = item.get('contentDetails', {})
+                video_id = content_details.get('videoId')
+                if not video_id:
+                    continue
+
+                if stop_at_watermark:
+                    published_at = content_details.get('videoPublishedAt')
+                    # ISO 8601 UTC timestamps from the API compare correctly as strings
+                    if video_id == stop_at_watermark['video_id'] or (
+                            published_at and published_at <= stop_at_watermark['published_at']):
+                        reached_watermark = True
+                        break
+
+                current_playlist_video_ids.append(video_id)
+
+            if reached_watermark:
+                print(f"  Reached previously synced video in '{playlist_title}'. Stopping pagination.")
+                break
+
             next_video_token = items_response.get('nextPageToken')
             if not next_video_token:
                 break
 
         except Exception as e:
             print(f"  Error fetching items for playlist '{playlist_title}': {e}")
+            if fetch_errors is not None:
+                fetch_errors.append(f"items of playlist '{playlist_title}'")
             break
             
     # 2. Fetch full details for the collected video IDs (in batches of 50)
+    video_details = fetch_video_details(current_playlist_video_ids, playlist_title, fetch_errors)
+
+    # Keep playlist order (it drives page ordering) regardless of the order the API returns
+    playlist_positions = {}
+    for position, video_id in enumerate(current_playlist_video_ids):
+        playlist_positions.setdefault(video_id, position)
+    video_details.sort(key=lambda v: playlist_positions.get(v.get('id'), len(playlist_positions)))
+    return video_details
+
+
+def fetch_video_details(video_ids, context_title, fetch_errors=None):
+    """
+    Fetches full video details for a list of video IDs in batches of 50.
+    Videos that are deleted or private are simply absent from the result.
+    Failed batches are reported in fetch_errors (a list), if given.
+    Returns: list of video detail dictionaries.
+    """
     video_details = []
-    for i in range(0, len(current_playlist_video_ids), 50):
-        video_ids_chunk = current_playlist_video_ids[i:i + 50]
+    for i in range(0, len(video_ids), 50):
+        video_ids_chunk = video_ids[i:i + 50]
         try:
-            video_request = YOUTUBE_SERVICE.videos().list(
+            video_request = get_youtube_service().videos().list(
                 id=','.join(video_ids_chunk),
                 part='snippet,contentDetails'
             )
-            video_response = video_request.execute()
+            video_response = execute_youtube_request(video_request)
             video_details.extend(video_response.get('items', []))
         except Exception as e:
-            print(f"  Error fetching video details for chunk in '{playlist_title}': {e}")
+            print(f"  Error fetching video details for chunk in '{context_title}': {e}")
+            if fetch_errors is not None:
+                fetch_errors.append(f"video details in '{context_title}'")
             
     return video_details
 
 
-def get_playlists_and_videos():
+def fetch_user_playlists_metadata(fetch_errors=None):
     """
-    Fetches user-created playlists and determines the set of videos 
-    that are uploaded but NOT in any user-created playlist (uncategorized).
-    
-    Returns: A tuple: 
-             (List of structured playlist data, List of uncategorized video details)
+    Paginates through the channel's user-created playlists.
+    A failed request is reported in fetch_errors (a list), if given.
+    Returns: list of playlist dictionaries with an empty 'videos' list.
     """
-    user_playlists_sync_list = []
-    
-    # 1. Get the Master List of ALL Uploads
-    uploads_playlist_id = get_channel_uploads_playlist_id()
-    master_uploads_video_data = []
-    all_uploads_video_ids = set()
-    
-    if uploads_playlist_id:
-        print("\n-> Fetching ALL videos from the master uploads feed to establish the channel inventory...")
-        master_uploads_video_data = fetch_all_videos_for_playlist(uploads_playlist_id, "Master Uploads Feed")
-        all_uploads_video_ids.update({v['id'] for v in master_uploads_video_data if 'id' in v})
-    else:
-        print("WARNING: Could not fetch master uploads playlist ID. Cannot determine uncategorized videos.")
-        return [], []
-        
-    
-    # 2. Fetch User-Created Playlists Metadata
     user_playlists_metadata = []
-    all_user_playlist_video_ids = set()
     next_playlist_token = None
     print(f"\n-> Fetching all user-created playlists for Channel ID: {YOUTUBE_CHANNEL_ID}")
 
     while True:
         try:
-            playlists_request = YOUTUBE_SERVICE.playlists().list(
+            playlists_request = get_youtube_service().playlists().list(
                 channelId=YOUTUBE_CHANNEL_ID,
                 part='snippet,contentDetails',
                 maxResults=50,
                 pageToken=next_playlist_token
             )
-            playlists_response = playlists_request.execute()
+            playlists_response = execute_youtube_request(playlists_request)
             
             for playlist in playlists_response.get('items', []):
                 title = playlist['snippet']['title']
@@ -420,15 +838,86 @@ def get_playlists_and_videos():
                 
         except Exception as e:
             print(f"Error during YouTube user-created playlist fetch: {e}")
+            if fetch_errors is not None:
+                fetch_errors.append("user-created playlists")
             break
-            
+
+    return user_playlists_metadata
+
+
+def get_playlists_and_videos(sync_state=None, mirror=None):
+    """
+    Fetches user-created playlists and determines the set of videos
+    that are uploaded but NOT in any user-created playlist (uncategorized).
+
+    If sync_state is given, the uploads feed is only read down to the stored
+    watermark (unless a full inventory is due), and the watermark in sync_state
+    is advanced to the newest upload seen. If mirror is given, it is updated
+    with everything fetched, unless any YouTube request failed (the fetched lists
+    would then be incomplete). The caller is responsible for saving both.
+
+    Returns: A tuple:
+             (List of structured playlist data, List of uncategorized video details),
+             or (None, None) if nothing could be fetched because of API errors.
+    """
+    user_playlists_sync_list = []
+    fetch_errors = []
+    if sync_state is None:
+        sync_state = {}
+
+    # 1. Get the Master List of Uploads (all of them, or only those newer than the watermark)
+    uploads_playlist_id = get_channel_uploads_playlist_id()
+    master_uploads_video_data = []
+    all_uploads_video_ids = set()
+    # An empty mirror needs the complete uploads inventory to start from
+    full_inventory = is_full_inventory_due(sync_state) or (mirror is not None and not mirror['uploads_playlist_id'])
+
+    if uploads_playlist_id:
+        if full_inventory:
+            print("\n-> Fetching ALL videos from the master uploads feed to establish the channel inventory...")
+            master_uploads_video_data = fetch_all_videos_for_playlist(uploads_playlist_id, "Master Uploads Feed", fetch_errors=fetch_errors)
+        else:
+            watermark = sync_state['uploads_watermark']
+            print(f"\n-> Fetching uploads newer than the last synced video ({watermark['video_id']}, published {watermark['published_at']})...")
+            master_uploads_video_data = fetch_all_videos_for_playlist(
+                uploads_playlist_id, "Master Uploads Feed", stop_at_watermark=watermark, fetch_errors=fetch_errors
+            )
+            print(f"  Found {len(master_uploads_video_data)} new uploads since the last run.")
+        all_uploads_video_ids.update({v['id'] for v in master_uploads_video_data if 'id' in v})
+    else:
+        print("WARNING: Could not fetch master uploads playlist ID. Cannot determine uncategorized videos.")
+        return None, None
+
+    # Advance the watermark to the newest upload seen in this run. After a failed
+    # uploads fetch it stays put, since older new uploads may not have been reached.
+    uploads_fetch_failed = bool(fetch_errors)
+    if uploads_fetch_failed:
+        print("WARNING: The uploads feed could not be read completely. The uploads watermark is not advanced.")
+    elif master_uploads_video_data:
+        newest_video = max(master_uploads_video_data, key=lambda v: v['snippet']['publishedAt'])
+        current_watermark = sync_state.get('uploads_watermark')
+        if not current_watermark or newest_video['snippet']['publishedAt'] >= current_watermark['published_at']:
+            sync_state['uploads_watermark'] = {
+                'video_id': newest_video['id'],
+                'published_at': newest_video['snippet']['publishedAt'],
+            }
+    if full_inventory and not uploads_fetch_failed:
+        sync_state['last_full_inventory'] = time.time()
+
+    
+    # 2. Fetch User-Created Playlists Metadata
+    all_user_playlist_video_ids = set()
+    user_playlists_metadata = fetch_user_playlists_metadata(fetch_errors)
+
     print(f"  Found {len(user_playlists_metadata)} user-created playlists.")
     
     # 3. Process User-Created Playlists (Fetch Videos and Track IDs)
     print("\n-> Fetching videos and recording IDs for each user-created playlist...")
     
     for playlist_data in user_playlists_metadata:
-        videos_in_playlist = fetch_all_videos_for_playlist(playlist_data['playlist_id'], playlist_data['playlist_title'])
+        videos_in_playlist = fetch_all_videos_for_playlist(
+            playlist_data['playlist_id'], playlist_data['playlist_title'], fetch_errors=fetch_errors
+        )
         playlist_data['videos'] = videos_in_playlist
         
         # Collect all video IDs in user playlists
@@ -453,6 +942,17 @@ def get_playlists_and_videos():
     else:
         print("  No uncategorized videos found.")
 
+    if mirror is not None:
+        if fetch_errors:
+            # A partial fetch would silently truncate the snapshot that rebuilds depend on
+            print(f"WARNING: Not updating the YouTube mirror because {len(fetch_errors)} fetch(es) failed ({'; '.join(fetch_errors)}).")
+        else:
+            update_youtube_mirror(mirror, uploads_playlist_id, master_uploads_video_data, full_inventory, user_playlists_sync_list)
+
+    if fetch_errors and not user_playlists_sync_list and not master_uploads_video_data:
+        print(f"WARNING: No YouTube data could be fetched ({'; '.join(fetch_errors)}).")
+        return None, None
+
     total_videos_to_sync = len(all_user_playlist_video_ids) + len(uncategorized_videos)
     print(f"\nSuccessfully compiled {len(user_playlists_sync_list)} playlists and a unique set of {len(uncategorized_videos)} uncategorized videos (Total unique videos: {total_videos_to_sync}).")
     
@@ -460,38 +960,218 @@ def get_playlists_and_videos():
     return user_playlists_sync_list, uncategorized_videos
 
 
-def get_existing_page_details(book_id):
+# --- LOCAL YOUTUBE METADATA MIRROR ---
+
+def create_empty_youtube_mirror():
+    """Returns an empty in-memory mirror for the configured channel."""
+    return {
+        'channel_id': YOUTUBE_CHANNEL_ID,
+        'uploads_playlist_id': None,
+        'uploads': [],     # Video IDs in the uploads feed, newest first
+        'playlists': [],   # [{'playlist_id', 'playlist_title', 'video_ids'}, ...] in API order
+        'videos': {},      # {video_id: {'id', 'snippet', 'contentDetails'}, ...}
+        'updated_at': None,
+    }
+
+def compact_video_record(video):
+    """Keeps only the video fields the sync uses, so the mirror stays small."""
+    snippet = video.get('snippet', {})
+    return {
+        'id': video['id'],
+        'snippet': {field: snippet[field] for field in MIRROR_SNIPPET_FIELDS if field in snippet},
+        'contentDetails': video.get('contentDetails', {}),
+    }
+
+def load_youtube_mirror():
     """
-    Fetches the content of every existing page in the book to extract the 
-    synced YouTube video ID for robust duplication checking.
-    
-    Returns: A dictionary mapping {youtube_id: page_id, ...} for all synced pages.
+    Loads the mirror snapshot (gzip-compressed JSONL: one channel record, then one
+    record per playlist and per video).
+    Returns: The mirror dictionary; empty if the file is missing, unreadable,
+             or belongs to a different channel.
     """
-    session = create_bookstack_session()
-    pages_map = {}
-    
-    print(f"-> Scanning existing BookStack page content for embedded YouTube IDs...")
-    url_book_structure = f"{BOOKSTACK_URL.rstrip('/')}/api/books/{book_id}"
-    
+    mirror = create_empty_youtube_mirror()
+    if not os.path.exists(YOUTUBE_MIRROR_FILE):
+        return mirror
+
     try:
-        response = session.get(
-            url_book_structure, 
-            headers=BOOKSTACK_HEADERS, 
-            verify=False, 
-            timeout=REQUEST_TIMEOUT_SECONDS
-        )
-        response.raise_for_status()
-        
-        # Get all pages, including those nested in chapters
-        pages_to_check = extract_items_from_structure(response.json().get('contents', []), item_type='page')
+        with gzip.open(YOUTUBE_MIRROR_FILE, 'rt', encoding='utf-8') as mirror_file:
+            for line in mirror_file:
+                record = json.loads(line)
+                record_type = record.pop('type')
+                if record_type == 'channel':
+                    if record.get('channel_id') != YOUTUBE_CHANNEL_ID:
+                        print(f"WARNING: {YOUTUBE_MIRROR_FILE} belongs to channel {record.get('channel_id')}. Ignoring it.")
+                        return create_empty_youtube_mirror()
+                    mirror.update(record)
+                elif record_type == 'playlist':
+                    mirror['playlists'].append(record)
+                elif record_type == 'video':
+                    mirror['videos'][record['id']] = record
+    except (OSError, ValueError, KeyError) as e:
+        print(f"WARNING: Could not read YouTube mirror from {YOUTUBE_MIRROR_FILE} ({e}). Starting a new mirror.")
+        return create_empty_youtube_mirror()
+
+    return mirror
+
+def save_youtube_mirror(mirror):
+    """
+    Writes the mirror as a gzip-compressed JSONL snapshot. A temporary file is
+    used so an interrupted write never replaces a good snapshot.
+    """
+    temp_path = f"{YOUTUBE_MIRROR_FILE}.tmp"
+    try:
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as mirror_file:
+            channel_record = {
+                'type': 'channel',
+                'channel_id': mirror['channel_id'],
+                'uploads_playlist_id': mirror['uploads_playlist_id'],
+                'uploads': mirror['uploads'],
+                'updated_at': mirror['updated_at'],
+            }
+            mirror_file.write(json.dumps(channel_record, separators=(',', ':')) + '\n')
+            for playlist in mirror['playlists']:
+                mirror_file.write(json.dumps({'type': 'playlist', **playlist}, separators=(',', ':')) + '\n')
+            for video in mirror['videos'].values():
+                mirror_file.write(json.dumps({'type': 'video', **video}, separators=(',', ':')) + '\n')
+        os.replace(temp_path, YOUTUBE_MIRROR_FILE)
+        print(f"  Saved YouTube mirror: {len(mirror['playlists'])} playlists, {len(mirror['videos'])} videos.")
+    except OSError as e:
+        print(f"WARNING: Could not save YouTube mirror to {YOUTUBE_MIRROR_FILE}: {e}")
+
+def update_youtube_mirror(mirror, uploads_playlist_id, uploads_video_data, full_inventory, playlists_data):
+    """
+    Merges the data fetched in this run into the mirror. Playlists are always fetched
+    in full and replace the mirrored ones. Uploads replace the mirrored inventory on a
+    full inventory run and are prepended otherwise; videos no longer referenced are
+    only dropped on full inventory runs.
+    """
+    mirror['uploads_playlist_id'] = uploads_playlist_id
+
+    new_upload_ids = [video['id'] for video in uploads_video_data]
+    if full_inventory:
+        mirror['uploads'] = new_upload_ids
+    else:
+        known_upload_ids = set(new_upload_ids)
+        mirror['uploads'] = new_upload_ids + [video_id for video_id in mirror['uploads'] if video_id not in known_upload_ids]
+
+    mirror['playlists'] = [
+        {
+            'playlist_id': playlist['playlist_id'],
+            'playlist_title': playlist['playlist_title'],
+            'video_ids': [video['id'] for video in playlist['videos']],
+        }
+        for playlist in playlists_data
+    ]
+
+    for video in uploads_video_data:
+        mirror['videos'][video['id']] = compact_video_record(video)
+    for playlist in playlists_data:
+        for video in playlist['videos']:
+            mirror['videos'][video['id']] = compact_video_record(video)
+
+    if full_inventory:
+        referenced_video_ids = set(mirror['uploads'])
+        for playlist in mirror['playlists']:
+            referenced_video_ids.update(playlist['video_ids'])
+        mirror['videos'] = {video_id: video for video_id, video in mirror['videos'].items() if video_id in referenced_video_ids}
+
+    mirror['updated_at'] = time.time()
+
+def get_playlists_and_videos_from_mirror(mirror):
+    """
+    Builds the same playlist and uncategorized video lists as get_playlists_and_videos()
+    from the local mirror, without any YouTube API calls.
+    Returns: A tuple:
+             (List of structured playlist data, List of uncategorized video details)
+    """
+    videos = mirror['videos']
+    print(f"\n-> Loading channel inventory from the local mirror ({YOUTUBE_MIRROR_FILE})...")
+
+    playlists_data = []
+    all_user_playlist_video_ids = set()
+    for playlist in mirror['playlists']:
+        playlist_videos = [videos[video_id] for video_id in playlist['video_ids'] if video_id in videos]
+        all_user_playlist_video_ids.update(video['id'] for video in playlist_videos)
+        playlists_data.append({
+            'playlist_id': playlist['playlist_id'],
+            'playlist_title': playlist['playlist_title'],
+            'videos': playlist_videos,
+            'is_uploads_feed': False
+        })
+
+    uncategorized_videos = [
+        videos[video_id] for video_id in mirror['uploads']
+        if video_id in videos and video_id not in all_user_playlist_video_ids
+    ]
+
+    print(f"  Loaded {len(playlists_data)} playlists and {len(uncategorized_videos)} uncategorized videos "
+          f"({len(videos)} videos in total).")
+    return playlists_data, uncategorized_videos
+
+class BookExportEmbedParser(HTMLParser):
+    """
+    Incremental parser for BookStack's book HTML export. Each page in the export
+    starts with <h1 id="page-{id}">, so the first YouTube iframe after that heading
+    is attributed to that page. Data can be fed in chunks as it is downloaded.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.current_page_id = None
+        self.seen_page_ids = set()
+        self.page_youtube_ids = {}
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == 'h1':
+            heading_id = attributes.get('id') or ''
+            match = EXPORT_PAGE_HEADING_REGEX.fullmatch(heading_id)
+            if match:
+                self.current_page_id = int(match.group(1))
+                self.seen_page_ids.add(self.current_page_id)
+            elif heading_id.startswith('chapter-'):
+                self.current_page_id = None
+        elif tag == 'iframe' and self.current_page_id is not None and self.current_page_id not in self.page_youtube_ids:
+            match = YOUTUBE_EMBED_REGEX.search(attributes.get('src') or '')
+            if match:
+                self.page_youtube_ids[self.current_page_id] = match.group(1)
+
+def scan_book_export(session, book_id):
+    """
+    Downloads the whole book in one request via the HTML export endpoint and
+    stream-parses it for embedded YouTube IDs.
+    Returns: A BookExportEmbedParser with the results, or None if the export failed.
+    """
+    url_export = f"{BOOKSTACK_URL.rstrip('/')}/api/books/{book_id}/export/html"
+    parser = BookExportEmbedParser()
+
+    try:
+        with session.get(
+            url_export,
+            headers=BOOKSTACK_HEADERS,
+            verify=False,
+            timeout=BOOK_EXPORT_TIMEOUT_SECONDS,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            for chunk in response.iter_content(chunk_size=65536, decode_unicode=True):
+                parser.feed(chunk)
+        parser.close()
     except requests.exceptions.RequestException as e:
-        print(f"Error getting book structure: {e}")
-        return pages_map 
-    
-    print(f"  Found {len(pages_to_check)} existing pages to check.")
-    
+        http_status = e.response.status_code if e.response is not None else "Unknown"
+        print(f"  Book export scan failed (HTTP Error {http_status}). Falling back to per-page scan.")
+        return None
+
+    return parser
+
+def scan_pages_individually(session, pages_to_check):
+    """
+    Fetches each page's content with one request per page to find its embedded YouTube ID.
+    Returns: A tuple ({page_id: youtube_id, ...}, number of pages scanned)
+    """
+    page_youtube_ids = {}
     count_scanned = 0
-    count_found = 0
     
     for page_data in pages_to_check:
         page_id = page_data.get('id')
@@ -516,38 +1196,109 @@ def get_existing_page_details(book_id):
             match = YOUTUBE_EMBED_REGEX.search(html_content)
             
             if match:
-                youtube_id = match.group(1)
-                pages_map[youtube_id] = page_id
-                count_found += 1
+                page_youtube_ids[page_id] = match.group(1)
             
         except requests.exceptions.RequestException as e:
             http_status = e.response.status_code if e.response is not None else "Unknown"
             print(f"  FAILED to fetch content for page '{page_name}' (ID: {page_id}). HTTP Error {http_status}.")
             
         count_scanned += 1
-        
-    print(f"  Scan complete. Found {count_found} YouTube IDs mapped across {count_scanned} pages in the BookStack content.")
-    return pages_map
 
-def create_bookstack_page(video_data, book_id, chapter_id=None):
+    return page_youtube_ids, count_scanned
+
+def get_existing_page_details(book_id, use_export_scan=None):
     """
-    Constructs the page content and calls the BookStack API to create a new page
-    within the specified chapter OR directly in the book if chapter_id is None.
+    Fetches the content of every existing page in the book to extract the 
+    synced YouTube video ID for robust duplication checking.
+
+    By default (USE_BOOK_EXPORT_SCAN) the whole book is read in a single export
+    request; pages the export does not cover are fetched one by one.
+    
+    Returns: A dictionary mapping {youtube_id: [{'id': page_id, 'chapter_id': chapter_id}, ...], ...}
+             for all synced pages. chapter_id is None for pages at the book root.
     """
+    if use_export_scan is None:
+        use_export_scan = USE_BOOK_EXPORT_SCAN
+
     session = create_bookstack_session()
-    snippet = video_data['snippet']
-    video_id = video_data['id']
+    pages_map = {}
     
-    # --- TITLE GENERATION ---
-    title = snippet['title']
-    full_title = title.strip()
+    print(f"-> Scanning existing BookStack page content for embedded YouTube IDs...")
+    url_book_structure = f"{BOOKSTACK_URL.rstrip('/')}/api/books/{book_id}"
     
-    if APPEND_YOUTUBE_ID_TO_TITLE:
-        full_title = f"{full_title} (YouTube ID: {video_id})"
-
-    print(f"    Attempting to create page for: '{full_title}'")
-
-    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    try:
+        response = session.get(
+            url_book_structure, 
+            headers=BOOKSTACK_HEADERS, 
+            verify=False, 
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        contents = response.json().get('contents', [])
+        
+        # Get all pages, including those nested in chapters
+        pages_to_check = extract_items_from_structure(contents, item_type='page')
+    except requests.exceptions.RequestException as e:
+        print(f"Error getting book structure: {e}")
+        return pages_map 
+    
+    # Pages at the book root have no chapter
+    page_chapter_ids = {}
+    for item in contents:
+        if item.get('type') == 'chapter':
+            for page in item.get('pages', []):
+                page_chapter_ids[page['id']] = item['id']
+
+    print(f"  Found {len(pages_to_check)} existing pages to check.")
+    
+    page_youtube_ids = {}
+    count_scanned = 0
+    pages_to_fetch = pages_to_check
+
+    # 1. Fast path: one export request for the whole book
+    if use_export_scan and pages_to_check:
+        export_results = scan_book_export(session, book_id)
+        if export_results is not None:
+            page_youtube_ids.update(export_results.page_youtube_ids)
+            pages_to_fetch = [page for page in pages_to_check if page['id'] not in export_results.seen_page_ids]
+            count_scanned += len(pages_to_check) - len(pages_to_fetch)
+            print(f"  Book export covered {count_scanned} pages. {len(pages_to_fetch)} pages left to fetch individually.")
+
+    # 2. Fallback: one request per page not covered by the export
+    if pages_to_fetch:
+        individual_results, individual_count = scan_pages_individually(session, pages_to_fetch)
+        page_youtube_ids.update(individual_results)
+        count_scanned += individual_count
+
+    for page_data in pages_to_check:
+        youtube_id = page_youtube_ids.get(page_data['id'])
+        if youtube_id:
+            pages_map.setdefault(youtube_id, []).append({
+                'id': page_data['id'],
+                'chapter_id': page_chapter_ids.get(page_data['id']),
+            })
+        
+    print(f"  Scan complete. Found {len(page_youtube_ids)} YouTube IDs mapped across {count_scanned} pages in the BookStack content.")
+    return pages_map
+
+def build_bookstack_page_payload(video_data, book_id, chapter_id=None, transcript_html='', existing_tags=None):
+    """
+    Constructs the page title and API payload for a video.
+    A transcript section is appended when transcript_html is provided.
+    Any existing tags are kept, since BookStack replaces the whole tag list on update.
+    Returns: A tuple (full_title, payload dictionary)
+    """
+    snippet = video_data['snippet']
+    video_id = video_data['id']
+    
+    # --- TITLE GENERATION ---
+    title = snippet['title']
+    full_title = title.strip()
+    
+    if APPEND_YOUTUBE_ID_TO_TITLE:
+        full_title = f"{full_title} (YouTube ID: {video_id})"
+
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
     embed_url = f"https://www.youtube.com/embed/{video_id}"
     
     # --- HTML Page Content Generation ---
@@ -573,18 +1324,49 @@ def create_bookstack_page(video_data, book_id, chapter_id=None):
         <li><strong>Channel:</strong> {snippet['channelTitle']}</li>
     </ul>
     """
+
+    if transcript_html:
+        html_content += f"""
+    <p style="font-size: 1.2em; font-weight: bold; margin-top: 20px;">Transcript:</p>
+    <hr>
+    {transcript_html}
+    """
     
     # Base payload structure (Python dict)
+    # The video ID tag lets targeted syncs find the page with one search request.
+    tags = [
+        {'name': tag['name'], 'value': tag.get('value', ''), 'order': 0}
+        for tag in (existing_tags or []) if tag.get('name') != YOUTUBE_VIDEO_ID_TAG
+    ]
+    tag_names = {tag['name'] for tag in tags}
+    tags.extend({'name': tag, 'value': '', 'order': 0} for tag in snippet.get('tags', []) if tag not in tag_names)
+    tags.append({'name': YOUTUBE_VIDEO_ID_TAG, 'value': video_id, 'order': 0})
     payload = {
         'name': full_title,
         'html': html_content,
         'book_id': book_id,
-        'tags': [{'name': tag, 'value': '', 'order': 0} for tag in snippet.get('tags', [])]
+        'tags': tags
     }
     
     # Only include chapter_id if it is provided
     if chapter_id is not None:
         payload['chapter_id'] = chapter_id
+
+    return full_title, payload
+
+def create_bookstack_page(video_data, book_id, chapter_id=None, transcript_html='', priority=None):
+    """
+    Constructs the page content and calls the BookStack API to create a new page
+    within the specified chapter OR directly in the book if chapter_id is None.
+    An explicit priority positions the page; otherwise BookStack appends it.
+    Returns: The new page ID (integer) or False on failure.
+    """
+    session = create_bookstack_session()
+    full_title, payload = build_bookstack_page_payload(video_data, book_id, chapter_id, transcript_html)
+    if priority is not None:
+        payload['priority'] = priority
+
+    print(f"    Attempting to create page for: '{full_title}'")
         
     url = f"{BOOKSTACK_URL.rstrip('/')}/api/pages"
     
@@ -602,7 +1384,7 @@ def create_bookstack_page(video_data, book_id, chapter_id=None):
         new_page_slug = new_page_data.get('slug')
         
         print(f"    SUCCESS: Created page '{full_title}'.")
-        return True
+        return new_page_data['id']
         
     except requests.exceptions.RequestException as e:
         http_status = e.response.status_code if e.response is not None else "Unknown"
@@ -612,6 +1394,681 @@ def create_bookstack_page(video_data, book_id, chapter_id=None):
         
         return False
 
+def get_page_tags(page_id):
+    """
+    Reads the tags of a single page.
+    Returns: The tags list, or None if the page could not be read.
+    """
+    session = create_bookstack_session()
+    try:
+        time.sleep(API_DELAY_SECONDS)
+        response = session.get(
+            f"{BOOKSTACK_URL.rstrip('/')}/api/pages/{page_id}",
+            headers=BOOKSTACK_HEADERS,
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return response.json().get('tags', [])
+    except requests.exceptions.RequestException as e:
+        print(f"    FAILED to read tags for page ID {page_id}: {e}")
+        return None
+
+def update_bookstack_page(page_id, video_data, book_id, chapter_id=None, transcript_html='', existing_tags=None):
+    """
+    Re-renders an existing page from the current video metadata and files it
+    in the specified chapter (or the book root if chapter_id is None), keeping
+    its other tags. If existing_tags is not given, they are read first.
+    Returns: True on success.
+    """
+    session = create_bookstack_session()
+
+    if existing_tags is None:
+        existing_tags = get_page_tags(page_id)
+        if existing_tags is None:
+            # Updating without the current tags would delete them
+            print(f"    Skipping update of page ID {page_id} because its tags could not be read.")
+            return False
+
+    full_title, payload = build_bookstack_page_payload(video_data, book_id, chapter_id, transcript_html, existing_tags)
+
+    print(f"    Attempting to update page ID {page_id} for: '{full_title}'")
+
+    url = f"{BOOKSTACK_URL.rstrip('/')}/api/pages/{page_id}"
+
+    try:
+        response = session.put(
+            url,
+            headers=BOOKSTACK_HEADERS,
+            json=payload,
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+
+        print(f"    SUCCESS: Updated page '{full_title}'.")
+        return True
+
+    except requests.exceptions.RequestException as e:
+        http_status = e.response.status_code if e.response is not None else "Unknown"
+        error_details = e.response.text if e.response is not None else str(e)
+
+        print(f"    FAILED to update page '{full_title}'. HTTP Error {http_status}: {error_details}")
+
+        return False
+
+def move_bookstack_page(page_id, book_id, chapter_id=None):
+    """
+    Moves an existing page into a chapter (or the book root if chapter_id is None)
+    with a single update call, keeping its content and ID.
+    Returns: True on success.
+    """
+    session = create_bookstack_session()
+    url = f"{BOOKSTACK_URL.rstrip('/')}/api/pages/{page_id}"
+    payload = {'chapter_id': chapter_id} if chapter_id is not None else {'book_id': book_id}
+
+    try:
+        response = session.put(
+            url,
+            headers=BOOKSTACK_HEADERS,
+            json=payload,
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+
+        destination = f"Chapter ID {chapter_id}" if chapter_id is not None else "the Book root"
+        print(f"    MOVED: Page ID {page_id} into {destination}.")
+        return True
+
+    except requests.exceptions.RequestException as e:
+        http_status = e.response.status_code if e.response is not None else "Unknown"
+        error_details = e.response.text if e.response is not None else str(e)
+
+        print(f"    FAILED to move page ID {page_id}. HTTP Error {http_status}: {error_details}")
+
+        return False
+
+def compute_priority_updates(page_ids, current_priorities):
+    """
+    Computes the smallest set of priority changes that puts pages into the given order.
+    The longest strictly increasing run of current priorities (in target order) stays
+    in place; every other page gets a priority in the gap between its kept neighbours.
+    If a gap is too narrow (BookStack numbers pages 0, 1, 2, ...), the pages on one side
+    of it (whichever needs fewer updates) are shifted and respaced in steps of
+    PAGE_PRIORITY_STEP, so a densely numbered chapter pays for the shift only once.
+
+    page_ids: page IDs in the desired order.
+    current_priorities: their current priorities, in the same order.
+    Returns: A dictionary {page_id: new_priority, ...} for the pages that must change.
+    """
+    count = len(page_ids)
+    if count == 0:
+        return {}
+
+    # 1. Longest strictly increasing subsequence (patience sorting, O(n log n))
+    tail_values = []   # Smallest tail value of an increasing run of each length
+    tail_indices = []  # Index of that tail
+    previous_index = [-1] * count
+    for index, priority in enumerate(current_priorities):
+        run_length = bisect.bisect_left(tail_values, priority)
+        if run_length == len(tail_values):
+            tail_values.append(priority)
+            tail_indices.append(index)
+        else:
+            tail_values[run_length] = priority
+            tail_indices[run_length] = index
+        previous_index[index] = tail_indices[run_length - 1] if run_length > 0 else -1
+
+    kept_indices = set()
+    index = tail_indices[-1]
+    while index != -1:
+        kept_indices.add(index)
+        index = previous_index[index]
+
+    # 2. Walk the pages in order, fitting each run of displaced pages between its neighbours.
+    # Priorities never go below 0; 'last' is the final priority of the previous page.
+    new_priorities = list(current_priorities)
+    last = -1
+    position = 0
+    while position < count:
+        if position in kept_indices:
+            # A kept page only moves if a shift from an earlier run pushed into it
+            if new_priorities[position] <= last:
+                new_priorities[position] = last + PAGE_PRIORITY_STEP
+            last = new_priorities[position]
+            position += 1
+            continue
+
+        run_start = position
+        while position < count and position not in kept_indices:
+            position += 1
+        run_length = position - run_start
+
+        if position == count:
+            # Nothing after the run: append with the usual spacing
+            for offset in range(run_length):
+                new_priorities[run_start + offset] = last + PAGE_PRIORITY_STEP * (offset + 1)
+            break
+
+        upper = current_priorities[position]
+        if upper - last - 1 >= run_length:
+            for offset in range(run_length):
+                new_priorities[run_start + offset] = last + ((offset + 1) * (upper - last)) // (run_length + 1)
+            last = new_priorities[position - 1]
+            continue
+
+        # No room between the neighbours. Shifting left lowers earlier pages until a gap
+        # absorbs the run; shifting right raises later pages (in the loop above). Shifted
+        # pages are respaced by PAGE_PRIORITY_STEP, so the next move finds a gap.
+        left_updates = []
+        needed = upper - PAGE_PRIORITY_STEP * run_length
+        for left_index in range(run_start - 1, -1, -1):
+            if new_priorities[left_index] < needed:
+                break
+            needed -= PAGE_PRIORITY_STEP
+            left_updates.append((left_index, needed))
+        if needed < 0:
+            left_updates = None
+
+        right_update_count = 0
+        shifted_last = last + PAGE_PRIORITY_STEP * run_length
+        for right_index in range(position, count):
+            if right_index in kept_indices and current_priorities[right_index] > shifted_last:
+                break
+            right_update_count += right_index in kept_indices
+            shifted_last += PAGE_PRIORITY_STEP
+
+        if left_updates is not None and len(left_updates) < right_update_count:
+            for left_index, priority in left_updates:
+                new_priorities[left_index] = priority
+            for offset in range(run_length):
+                new_priorities[run_start + offset] = upper - PAGE_PRIORITY_STEP * (run_length - offset)
+        else:
+            for offset in range(run_length):
+                new_priorities[run_start + offset] = last + PAGE_PRIORITY_STEP * (offset + 1)
+        last = new_priorities[position - 1]
+
+    return {
+        page_id: new_priority
+        for page_id, old_priority, new_priority in zip(page_ids, current_priorities, new_priorities)
+        if new_priority != old_priority
+    }
+
+def sync_chapter_page_order(book_id, chapter_page_orders):
+    """
+    Sets page priorities so each chapter lists its pages in playlist order,
+    sending only the priority updates that compute_priority_updates() requires.
+
+    chapter_page_orders: {chapter_id: [page_id, ...] in playlist order}
+    Returns: The number of pages whose priority was updated.
+    """
+    session = create_bookstack_session()
+    url_book_structure = f"{BOOKSTACK_URL.rstrip('/')}/api/books/{book_id}"
+
+    # One request gives the current priority of every page in the book
+    try:
+        response = session.get(
+            url_book_structure,
+            headers=BOOKSTACK_HEADERS,
+            verify=False,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        contents = response.json().get('contents', [])
+    except requests.exceptions.RequestException as e:
+        print(f"Error getting book structure to sync page order: {e}")
+        return 0
+
+    current_priorities = {
+        page['id']: page.get('priority', 0)
+        for page in extract_items_from_structure(contents, item_type='page')
+    }
+
+    pages_reordered = 0
+    for chapter_id, ordered_page_ids in chapter_page_orders.items():
+        # A page can appear only once per chapter, and must still exist
+        ordered_page_ids = [page_id for page_id in dict.fromkeys(ordered_page_ids) if page_id in current_priorities]
+        priority_updates = compute_priority_updates(
+            ordered_page_ids, [current_priorities[page_id] for page_id in ordered_page_ids]
+        )
+        if not priority_updates:
+            continue
+
+        print(f"  Chapter ID {chapter_id}: updating the position of {len(priority_updates)} of {len(ordered_page_ids)} pages.")
+        for page_id, priority in priority_updates.items():
+            try:
+                time.sleep(API_DELAY_SECONDS)
+                response = session.put(
+                    f"{BOOKSTACK_URL.rstrip('/')}/api/pages/{page_id}",
+                    headers=BOOKSTACK_HEADERS,
+                    json={'priority': priority},
+                    verify=False,
+                    timeout=REQUEST_TIMEOUT_SECONDS
+                )
+                response.raise_for_status()
+                pages_reordered += 1
+            except requests.exceptions.RequestException as e:
+                http_status = e.response.status_code if e.response is not None else "Unknown"
+                print(f"    FAILED to set priority of page ID {page_id}. HTTP Error {http_status}.")
+
+    return pages_reordered
+
+def claim_existing_pages(placements, existing_pages_map):
+    """
+    Assigns existing pages to placements (video, chapter ID, destination label), each page
+    to at most one placement, so a video in two playlists keeps two pages. Pages already in
+    the placement's chapter are claimed first; pages left over after that are reused, in
+    placement order, for placements whose chapter has no page yet. A page is therefore
+    never moved out of a chapter that still needs it.
+    Returns: A dictionary {placement_index: existing page dictionary}. A page whose
+             'chapter_id' differs from the placement's has to be moved.
+    """
+    claimed_pages = {}
+    claimed_page_ids = set()
+
+    for placement_index, (video, chapter_id, destination) in enumerate(placements):
+        existing_page = next((
+            page for page in existing_pages_map.get(video['id'], [])
+            if page['chapter_id'] == chapter_id and page['id'] not in claimed_page_ids
+        ), None)
+        if existing_page:
+            claimed_pages[placement_index] = existing_page
+            claimed_page_ids.add(existing_page['id'])
+
+    for placement_index, (video, chapter_id, destination) in enumerate(placements):
+        if placement_index in claimed_pages:
+            continue
+        leftover_page = next((
+            page for page in existing_pages_map.get(video['id'], [])
+            if page['id'] not in claimed_page_ids
+        ), None)
+        if leftover_page:
+            claimed_pages[placement_index] = leftover_page
+            claimed_page_ids.add(leftover_page['id'])
+
+    return claimed_pages
+
+def find_existing_pages_for_video(book_id, video_id):
+    """
+    Finds the pages of a single video without scanning the whole book. Pages are
+    searched by their video ID tag and by the exact video ID term (for pages
+    created before the tag existed). Candidates are confirmed against the embed URL.
+    Returns: list of dictionaries {'id': page_id, 'chapter_id': chapter_id, 'tags': tags}
+    """
+    session = create_bookstack_session()
+    url_search = f"{BOOKSTACK_URL.rstrip('/')}/api/search"
+    search_queries = [
+        f"[{YOUTUBE_VIDEO_ID_TAG}={video_id}] {{type:page}}",
+        f'"{video_id}" {{type:page}}',
+    ]
+    checked_page_ids = set()
+    found_pages = []
+
+    for query in search_queries:
+        try:
+            time.sleep(API_DELAY_SECONDS)
+            response = session.get(
+                url_search,
+                headers=BOOKSTACK_HEADERS,
+                params={'query': query, 'count': 20},
+                verify=False,
+                timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            results = response.json().get('data', [])
+        except requests.exceptions.RequestException as e:
+            print(f"  Error searching BookStack for video {video_id}: {e}")
+            continue
+
+        for result in results:
+            page_id = result.get('id')
+            if result.get('type') != 'page' or result.get('book_id') != book_id or page_id in checked_page_ids:
+                continue
+            checked_page_ids.add(page_id)
+
+            try:
+                time.sleep(API_DELAY_SECONDS)
+                response = session.get(
+                    f"{BOOKSTACK_URL.rstrip('/')}/api/pages/{page_id}",
+                    headers=BOOKSTACK_HEADERS,
+                    verify=False,
+                    timeout=REQUEST_TIMEOUT_SECONDS
+                )
+                response.raise_for_status()
+                page_data = response.json()
+            except requests.exceptions.RequestException as e:
+                print(f"  FAILED to fetch content for page ID {page_id}: {e}")
+                continue
+
+            match = YOUTUBE_EMBED_REGEX.search(page_data.get('html', ''))
+            if match and match.group(1) == video_id:
+                found_pages.append({'id': page_id, 'chapter_id': page_data.get('chapter_id') or None, 'tags': page_data.get('tags', [])})
+
+    return found_pages
+
+def find_playlists_containing_video(video_id, playlists_metadata):
+    """
+    Checks each user-created playlist for membership of a single video
+    (one filtered playlistItems request per playlist).
+    Returns: list of the playlist dictionaries that contain the video.
+    """
+    containing_playlists = []
+    for playlist_data in playlists_metadata:
+        try:
+            items_request = get_youtube_service().playlistItems().list(
+                playlistId=playlist_data['playlist_id'],
+                videoId=video_id,
+                part='id',
+                maxResults=1
+            )
+            if execute_youtube_request(items_request).get('items'):
+                containing_playlists.append(playlist_data)
+        except Exception as e:
+            print(f"  Error checking playlist '{playlist_data['playlist_title']}' for video {video_id}: {e}")
+    return containing_playlists
+
+def sync_single_videos(video_ids):
+    """
+    Targeted sync for a handful of videos (e.g. from a push notification): each
+    video gets a page, created or updated, in the chapter of every playlist that
+    contains it, or in the book root if it is in no user-created playlist.
+    Videos of other channels are skipped; deleted or private videos are left
+    for the next full sync.
+    """
+    book_id = TARGET_BOOK_ID
+    print(f"\n--- Targeted Sync for {len(video_ids)} video(s): {', '.join(video_ids)} ---")
+
+    videos = fetch_video_details(list(video_ids), "Targeted Sync")
+    found_video_ids = {v['id'] for v in videos}
+    for video_id in video_ids:
+        if video_id not in found_video_ids:
+            print(f"  Video {video_id} is no longer available (deleted or private). Leaving it for the next full sync.")
+
+    # Only videos of the synced channel may get pages
+    for video in videos:
+        if video['snippet'].get('channelId') != YOUTUBE_CHANNEL_ID:
+            print(f"  WARNING: Skipping video {video['id']}: it belongs to another channel ('{video['snippet'].get('channelId')}').")
+    videos = [v for v in videos if v['snippet'].get('channelId') == YOUTUBE_CHANNEL_ID]
+
+    if not videos:
+        return
+
+    playlists_metadata = fetch_user_playlists_metadata()
+
+    # File each video in the chapter of every playlist that contains it
+    target_playlists = {video['id']: find_playlists_containing_video(video['id'], playlists_metadata) for video in videos}
+
+    needed_playlists = list({p['playlist_id']: p for playlists in target_playlists.values() for p in playlists}.values())
+    chapter_sync_map = {}
+    if needed_playlists:
+        chapter_sync_map, _, _ = resolve_playlist_chapters(book_id, needed_playlists)
+
+    pages_created = 0
+    pages_updated = 0
+
+    for video in videos:
+        video_id = video['id']
+
+        placements = []
+        for playlist in target_playlists[video_id]:
+            chapter_id = chapter_sync_map.get(playlist['playlist_id'])
+            if not chapter_id:
+                print(f"WARNING: Could not determine chapter ID for playlist '{playlist['playlist_title']}'. Skipping it for video {video_id}.")
+                continue
+            placements.append((video, chapter_id, f"Chapter: '{playlist['playlist_title']}' (ID: {chapter_id})"))
+        if not target_playlists[video_id]:
+            placements.append((video, None, "the Book root (uncategorized)"))
+        if not placements:
+            continue
+
+        # Re-rendering the page replaces its content, so the transcript has to be included again.
+        # Push notifications are rare, so the caption track is always checked here.
+        transcript_html = ''
+        if SYNC_TRANSCRIPTS:
+            if video.get('contentDetails', {}).get('caption') == 'true':
+                transcript_html, _ = fetch_video_transcript(video)
+            else:
+                transcript_html = (load_cached_transcript(video_id) or {}).get('html', '')
+
+        # Pages already in a target chapter are updated there; other pages of the video are
+        # moved (by the update) into target chapters that have none; the rest get new pages.
+        claimed_pages = claim_existing_pages(placements, {video_id: find_existing_pages_for_video(book_id, video_id)})
+        all_pages_written = True
+        for placement_index, (video, chapter_id, destination) in enumerate(placements):
+            print(f"\n-> Syncing video {video_id} into {destination}")
+            existing_page = claimed_pages.get(placement_index)
+            if existing_page:
+                page_written = update_bookstack_page(existing_page['id'], video, book_id, chapter_id, transcript_html, existing_page['tags'])
+                pages_updated += page_written
+            else:
+                page_written = bool(create_bookstack_page(video, book_id, chapter_id, transcript_html))
+                pages_created += page_written
+            all_pages_written = all_pages_written and page_written
+
+            time.sleep(API_DELAY_SECONDS)
+
+        if all_pages_written:
+            mark_transcript_applied(video_id)
+
+    print(f"--- Targeted Sync Complete: {pages_created} page(s) created, {pages_updated} page(s) updated ---")
+
+# --- CAPTION / TRANSCRIPT INGESTION ---
+
+# Each transcript worker thread gets its own YouTube client (the client is not thread-safe)
+TRANSCRIPT_THREAD_STATE = threading.local()
+
+def get_thread_youtube_service():
+    """Returns a YouTube API client for the current worker thread."""
+    if not hasattr(TRANSCRIPT_THREAD_STATE, 'service'):
+        TRANSCRIPT_THREAD_STATE.service = build('youtube', 'v3', credentials=get_authenticated_credentials())
+    return TRANSCRIPT_THREAD_STATE.service
+
+def parse_vtt_timestamp(timestamp):
+    """Converts a WebVTT timestamp ('01:02:03.456' or '02:03.456') to seconds."""
+    seconds = 0.0
+    for part in timestamp.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_webvtt(vtt_text):
+    """
+    Converts WebVTT captions into clean text cues. Styling/timing tags are removed,
+    and lines repeated from the previous cue (rolling automatic captions) are dropped.
+    Returns: list of (start_seconds, text) tuples.
+    """
+    cues = []
+    previous_lines = set()
+
+    for block in re.split(r'\n\s*\n', vtt_text.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        timing_index = next((i for i, line in enumerate(lines) if '-->' in line), None)
+        if timing_index is None:
+            continue
+
+        try:
+            start_seconds = parse_vtt_timestamp(lines[timing_index].split('-->')[0].strip())
+        except ValueError:
+            continue
+
+        cue_lines = []
+        for line in lines[timing_index + 1:]:
+            clean_line = re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]+>', '', line))).strip()
+            if clean_line:
+                cue_lines.append(clean_line)
+
+        new_lines = [line for line in cue_lines if line not in previous_lines]
+        previous_lines = set(cue_lines)
+        if new_lines:
+            cues.append((start_seconds, ' '.join(new_lines)))
+
+    return cues
+
+def render_transcript_html(cues, video_id):
+    """
+    Renders caption cues as paragraphs of roughly TRANSCRIPT_PARAGRAPH_SECONDS, each
+    starting with a timestamp link that opens the video at that point.
+    """
+    paragraphs = []
+    paragraph_start = None
+    paragraph_text = []
+
+    for start_seconds, text in cues + [(None, None)]:
+        if paragraph_text and (start_seconds is None or start_seconds - paragraph_start >= TRANSCRIPT_PARAGRAPH_SECONDS):
+            minutes, seconds = divmod(int(paragraph_start), 60)
+            hours, minutes = divmod(minutes, 60)
+            label = f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+            paragraphs.append(
+                f'<p><a href="https://www.youtube.com/watch?v={video_id}&amp;t={int(paragraph_start)}s" target="_blank">[{label}]</a> '
+                f'{html.escape(" ".join(paragraph_text))}</p>'
+            )
+            paragraph_text = []
+        if start_seconds is None:
+            break
+        if not paragraph_text:
+            paragraph_start = start_seconds
+        paragraph_text.append(text)
+
+    return '\n'.join(paragraphs)
+
+def choose_caption_track(tracks):
+    """
+    Picks the caption track to ingest: tracks in TRANSCRIPT_LANGUAGES (manually created
+    before automatic/ASR, then in list order), then tracks in any other language.
+    Returns: The caption resource or None.
+    """
+    serving_tracks = [track for track in tracks if track['snippet'].get('status', 'serving') == 'serving']
+
+    def track_rank(track):
+        language = track['snippet'].get('language', '')
+        language_rank = TRANSCRIPT_LANGUAGES.index(language) if language in TRANSCRIPT_LANGUAGES else len(TRANSCRIPT_LANGUAGES)
+        is_asr = track['snippet'].get('trackKind', '').lower() == 'asr'
+        return (language not in TRANSCRIPT_LANGUAGES, is_asr, language_rank)
+
+    return min(serving_tracks, key=track_rank) if serving_tracks else None
+
+def load_cached_transcript(video_id):
+    """Returns the cached transcript record for a video, or None."""
+    try:
+        with open(os.path.join(TRANSCRIPT_CACHE_DIR, f"{video_id}.json"), 'r') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+def save_cached_transcript(video_id, record):
+    """Stores a rendered transcript, keyed by the caption track's etag."""
+    try:
+        os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+        temp_path = os.path.join(TRANSCRIPT_CACHE_DIR, f"{video_id}.json.tmp")
+        with open(temp_path, 'w') as cache_file:
+            json.dump(record, cache_file)
+        os.replace(temp_path, os.path.join(TRANSCRIPT_CACHE_DIR, f"{video_id}.json"))
+    except OSError as e:
+        print(f"  WARNING: Could not cache transcript for video {video_id}: {e}")
+
+def is_transcript_check_due(video, cached_transcript):
+    """
+    A captioned video's caption track is checked when nothing is cached for it yet, or
+    when the cached check is older than TRANSCRIPT_RECHECK_HOURS. Otherwise the cached
+    transcript is trusted without any YouTube call.
+    """
+    if video.get('contentDetails', {}).get('caption') != 'true':
+        return False
+    if cached_transcript is None:
+        return True
+    return time.time() - cached_transcript.get('checked_at', 0) >= TRANSCRIPT_RECHECK_HOURS * 3600
+
+def mark_transcript_applied(video_id):
+    """Records that every page of a video shows its cached transcript."""
+    cached_transcript = load_cached_transcript(video_id)
+    if cached_transcript and cached_transcript.get('pages_outdated'):
+        cached_transcript['pages_outdated'] = False
+        save_cached_transcript(video_id, cached_transcript)
+
+def fetch_video_transcript(video):
+    """
+    Checks a video's caption track (captions.list) and downloads and renders it only if
+    its etag differs from the cached one. The check time is cached either way.
+    A changed transcript is cached as 'pages_outdated' until mark_transcript_applied()
+    is called, so pages that were not updated in this run are updated in the next one.
+    Returns: A tuple (transcript HTML or '' if there are no usable captions,
+             True if the transcript changed since it was last cached)
+    """
+    video_id = video['id']
+    cached_transcript = load_cached_transcript(video_id)
+    cached_html = cached_transcript['html'] if cached_transcript else ''
+
+    service = get_thread_youtube_service()
+    try:
+        tracks = execute_youtube_request(service.captions().list(videoId=video_id, part='snippet')).get('items', [])
+        track = choose_caption_track(tracks)
+
+        if track is None or (cached_transcript and cached_transcript.get('etag') == track['etag']):
+            # Unchanged (or no usable track): only remember that the check was done
+            record = dict(cached_transcript or {'etag': None, 'track_id': None, 'language': '', 'html': ''})
+            record['checked_at'] = time.time()
+            save_cached_transcript(video_id, record)
+            return record['html'], False
+
+        caption_data = execute_youtube_request(service.captions().download(id=track['id'], tfmt='vtt'))
+        if isinstance(caption_data, bytes):
+            caption_data = caption_data.decode('utf-8', errors='replace')
+    except Exception as e:
+        print(f"  WARNING: Could not fetch captions for video {video_id}: {e}")
+        return cached_html, False
+
+    transcript_html = render_transcript_html(parse_webvtt(caption_data), video_id)
+    save_cached_transcript(video_id, {
+        'etag': track['etag'],
+        'track_id': track['id'],
+        'language': track['snippet'].get('language', ''),
+        'html': transcript_html,
+        'checked_at': time.time(),
+        'pages_outdated': transcript_html != cached_html or bool(cached_transcript and cached_transcript.get('pages_outdated')),
+    })
+    return transcript_html, transcript_html != cached_html
+
+def start_transcript_fetches(executor, videos):
+    """
+    Submits caption checks for the given videos (in order, once per video) whose check
+    is due, up to TRANSCRIPT_MAX_CHECKS_PER_RUN. The rest use their cached transcript
+    and are checked on a later run.
+    Returns: A dictionary {video_id: Future}
+    """
+    transcript_futures = {}
+    deferred_checks = 0
+    for video in videos:
+        if video['id'] in transcript_futures or not is_transcript_check_due(video, load_cached_transcript(video['id'])):
+            continue
+        if len(transcript_futures) >= TRANSCRIPT_MAX_CHECKS_PER_RUN:
+            deferred_checks += 1
+            continue
+        transcript_futures[video['id']] = executor.submit(fetch_video_transcript, video)
+
+    if transcript_futures or deferred_checks:
+        print(f"\n-> Checking captions of {len(transcript_futures)} video(s) in the background"
+              f"{f' ({deferred_checks} deferred to later runs to save quota)' if deferred_checks else ''}.")
+    return transcript_futures
+
+def wait_for_transcript(transcript_futures, video_id, block=True):
+    """
+    Returns the transcript for a video: the result of its caption check if one was
+    started (waiting up to TRANSCRIPT_WAIT_SECONDS, or not at all unless block is set),
+    otherwise the cached transcript.
+    Returns: A tuple (transcript HTML or '', True if it changed in this run)
+    """
+    future = transcript_futures.get(video_id)
+    if future is not None and (block or future.done()):
+        try:
+            return future.result(timeout=TRANSCRIPT_WAIT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            print(f"    Transcript for video {video_id} is not ready. The page is updated on a later run.")
+        except Exception as e:
+            print(f"    WARNING: Transcript for video {video_id} failed: {e}")
+
+    cached_transcript = load_cached_transcript(video_id)
+    return (cached_transcript['html'] if cached_transcript else ''), False
+
 def run_purge_script():
     """
     Executes the external shell script (purge_recycle_bin.sh) using subprocess.
@@ -653,9 +2110,25 @@ def run_purge_script():
 
 # --- MAIN SYNC LOGIC ---
 
-def run_sync():
+def run_sync(from_mirror=False):
+    """
+    Runs one sync cycle and adds its timings, request counts and errors
+    to the run history database.
+    """
+    global RUN_METRICS
+    RUN_METRICS = RunMetrics()
+    status = 'failed'
+    try:
+        status = 'ok' if run_sync_cycle(from_mirror) else 'stopped'
+    finally:
+        RUN_METRICS.end_phase()
+        record_run_history(RUN_METRICS, status)
+
+def run_sync_cycle(from_mirror=False):
     """
     Orchestrates the entire synchronization process, including chapters and pages.
+    If from_mirror is True, YouTube data comes from the local mirror instead of the API.
+    Returns: False if the sync stopped early, True otherwise.
     """
     print("--- YouTube Playlist to BookStack Chapter Sync Tool ---")
     
@@ -663,14 +2136,41 @@ def run_sync():
 
     if book_id is None:
         print("Sync stopped: TARGET_BOOK_ID is not set. Please set the integer ID.")
-        return
+        return False
 
     # 1. Fetch ALL YouTube Playlists and their Videos (includes Uncategorized)
-    playlists_data, uncategorized_videos_data = get_playlists_and_videos()
+    # Uploads older than the stored watermark are skipped unless a full inventory is due.
+    RUN_METRICS.begin_phase('youtube_fetch')
+    if from_mirror:
+        # Rebuild from the local mirror: no YouTube calls, and the uploads watermark is left alone
+        sync_state = None
+        mirror = load_youtube_mirror()
+        if not mirror['uploads_playlist_id']:
+            print(f"Sync stopped: No YouTube mirror found in {YOUTUBE_MIRROR_FILE}. Run a normal sync first.")
+            return False
+        playlists_data, uncategorized_videos_data = get_playlists_and_videos_from_mirror(mirror)
+    else:
+        sync_state = load_sync_state()
+        previous_watermark = sync_state.get('uploads_watermark')
+        mirror = load_youtube_mirror() if MAINTAIN_YOUTUBE_MIRROR else None
+        mirror_updated_at = mirror['updated_at'] if mirror is not None else None
+        playlists_data, uncategorized_videos_data = get_playlists_and_videos(sync_state, mirror)
+        # The mirror is left untouched (and not saved) when part of the fetch failed
+        if mirror is not None and mirror['updated_at'] != mirror_updated_at:
+            save_youtube_mirror(mirror)
+
+    if playlists_data is None:
+        print("Sync stopped: YouTube playlists and uploads could not be fetched (API error).")
+        return False
 
     if not playlists_data and not uncategorized_videos_data:
-        print("Sync stopped: No playlists or uncategorized videos found or API error.")
-        return
+        # E.g. an incremental run on a channel without playlists and no new uploads
+        print("\nNo playlists and no new uploads to sync. BookStack is left unchanged.")
+        if sync_state is not None:
+            save_sync_state(sync_state)
+        RUN_METRICS.begin_phase('purge')
+        run_purge_script()
+        return True
         
     
     # 2. Check for Force Resync / Deletion
@@ -678,6 +2178,7 @@ def run_sync():
     chapters_deleted = 0
     
     if FORCE_RESYNC:
+        RUN_METRICS.begin_phase('force_resync_delete')
         print("\n--- WARNING: DESTROY/RESYNC MODE ACTIVE (Deleting All Existing Pages/Chapters) ---")
         
         pages_to_delete, chapters_to_delete = get_book_items_for_deletion(book_id)
@@ -709,94 +2210,180 @@ def run_sync():
         
     else:
         # 3. Scan existing pages for YouTube IDs (Robust Duplication Check)
+        RUN_METRICS.begin_phase('page_scan')
         print("\n--- Scanning Existing BookStack Page Content ---")
         existing_pages_map = get_existing_page_details(book_id)
         
     
     # 4. Check/Create BookStack Chapters (only for playlists)
+    RUN_METRICS.begin_phase('chapters')
     print("\n--- Checking/Creating BookStack Chapters for Playlists ---")
-    # Fetch existing chapters to prevent re-creation
-    bookstack_chapter_map = get_existing_chapters(book_id)
-    
-    # This will store the final mapping: YouTube Playlist Title -> BookStack Chapter ID
-    chapter_sync_map = {}
-    chapters_created = 0
-    
-    for playlist in playlists_data:
-        p_title = playlist['playlist_title']
-        
-        if p_title in bookstack_chapter_map:
-            # Chapter exists, use its ID
-            chapter_id = bookstack_chapter_map[p_title]
-            print(f"  Found existing Chapter '{p_title}' (ID: {chapter_id}).")
-        else:
-            # Chapter does not exist, create it
-            chapter_id = create_bookstack_chapter(book_id, p_title)
-            if chapter_id:
-                chapters_created += 1
-            
-        chapter_sync_map[p_title] = chapter_id
+    # Chapters are matched by playlist ID, so a renamed playlist keeps its chapter
+    # This will store the final mapping: YouTube Playlist ID -> BookStack Chapter ID
+    chapter_sync_map, chapters_created, chapters_renamed = resolve_playlist_chapters(book_id, playlists_data)
         
     
     # 5. Start Page Creation Process
+    RUN_METRICS.begin_phase('pages')
     print("\n--- Starting Page Creation Process ---")
     
-    total_videos_processed = 0
     pages_created = 0
+    failed_videos = []  # Videos whose page could not be created
+    pages_moved = 0
     pages_skipped = 0
-    
-    # 5a. Process videos inside user-created chapters
+
+    # Every (video, chapter ID, destination label) this run should end up with.
+    # A chapter ID of None places the page at the root of the book.
+    placements = []
     for playlist in playlists_data:
         p_title = playlist['playlist_title']
-        chapter_id = chapter_sync_map.get(p_title)
+        chapter_id = chapter_sync_map.get(playlist['playlist_id'])
         
         if not chapter_id:
             print(f"WARNING: Could not determine chapter ID for playlist '{p_title}'. Skipping videos in this playlist.")
             continue
-            
-        print(f"\n-> Syncing videos into Chapter: '{p_title}' (ID: {chapter_id})")
-        
-        for video in playlist['videos']:
-            video_id = video['id']
-            total_videos_processed += 1
-            
-            # Check for duplication using the YouTube ID found in BookStack content
-            if video_id in existing_pages_map:
-                pages_skipped += 1
-                print(f"    Skipping: Video ID {video_id} is already present in BookStack (Page ID: {existing_pages_map[video_id]}).")
-                continue
-            
-            # If not found, create the page and associate it with the chapter
-            created = create_bookstack_page(video, book_id, chapter_id)
-            
-            if created:
+
+        placements.extend((video, chapter_id, f"Chapter: '{p_title}' (ID: {chapter_id})") for video in playlist['videos'])
+
+    # New chapter pages are created with spaced priorities in playlist order, so later
+    # reorders fit into the gaps instead of shifting the rest of the chapter.
+    placement_priorities = {}
+    if SYNC_PAGE_ORDER:
+        chapter_positions = {}
+        for placement_index, (video, chapter_id, destination) in enumerate(placements):
+            chapter_positions[chapter_id] = chapter_positions.get(chapter_id, 0) + 1
+            placement_priorities[placement_index] = PAGE_PRIORITY_STEP * chapter_positions[chapter_id]
+
+    placements.extend((video, None, "the Book root (uncategorized)") for video in uncategorized_videos_data)
+    total_videos_processed = len(placements)
+
+    # 5a. Keep pages that are already in the right place.
+    # Each existing page is claimed by at most one placement, so a video in two playlists keeps two pages.
+    claimed_pages = claim_existing_pages(placements, existing_pages_map)
+    placement_page_ids = {}  # Placement index -> page ID that now holds it
+    unplaced = []
+    for placement_index, (video, chapter_id, destination) in enumerate(placements):
+        video_id = video['id']
+        existing_page = claimed_pages.get(placement_index)
+
+        if existing_page and existing_page['chapter_id'] == chapter_id:
+            placement_page_ids[placement_index] = existing_page['id']
+            pages_skipped += 1
+            print(f"    Skipping: Video ID {video_id} is already present in {destination} (Page ID: {existing_page['id']}).")
+        else:
+            unplaced.append((placement_index, video, chapter_id, destination))
+
+    # 5b. Move a leftover page of the same video with one update call, or create a new page.
+    # Caption checks that are due run in the background while pages are written, in page order:
+    # videos getting a new page first, then videos whose existing page may need a newer transcript.
+    # Pages are created with whatever transcript is ready (or cached) and never wait for a check;
+    # the update pass below adds transcripts that arrive later. Mirror rebuilds only use the cache.
+    transcript_futures = {}
+    transcript_executor = None
+    if SYNC_TRANSCRIPTS and not from_mirror:
+        new_page_videos = [video for _, video, _, _ in unplaced if not existing_pages_map.get(video['id'])]
+        existing_page_videos = [video for video, _, _ in placements if existing_pages_map.get(video['id'])]
+        # Log in on the main thread so worker threads never start an OAuth flow
+        get_authenticated_credentials()
+        transcript_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TRANSCRIPT_WORKERS)
+        transcript_futures = start_transcript_fetches(transcript_executor, new_page_videos + existing_page_videos)
+
+    created_page_transcripts = {}  # Page ID -> transcript HTML it was created with
+    current_destination = None
+    for placement_index, video, chapter_id, destination in unplaced:
+        video_id = video['id']
+
+        if destination != current_destination:
+            print(f"\n-> Syncing videos into {destination}")
+            current_destination = destination
+
+        leftover_page = claimed_pages.get(placement_index)
+
+        if leftover_page:
+            # A failed move leaves the page where it is; no duplicate is created
+            if move_bookstack_page(leftover_page['id'], book_id, chapter_id):
+                leftover_page['chapter_id'] = chapter_id
+                placement_page_ids[placement_index] = leftover_page['id']
+                pages_moved += 1
+        else:
+            transcript_html = wait_for_transcript(transcript_futures, video_id, block=False)[0] if SYNC_TRANSCRIPTS else ''
+            new_page_id = create_bookstack_page(video, book_id, chapter_id, transcript_html, placement_priorities.get(placement_index))
+            if new_page_id:
+                placement_page_ids[placement_index] = new_page_id
+                created_page_transcripts[new_page_id] = transcript_html
                 pages_created += 1
+            else:
+                failed_videos.append(video)
             
-            # Politeness delay
-            time.sleep(API_DELAY_SECONDS)
-            
-    # 5b. Process uncategorized videos (direct to book root)
-    if uncategorized_videos_data:
-        print(f"\n-> Syncing {len(uncategorized_videos_data)} uncategorized videos directly into the Book root.")
-        for video in uncategorized_videos_data:
+        # Politeness delay
+        time.sleep(API_DELAY_SECONDS)
+
+    # Re-render pages whose transcript changed since they were written: existing pages of videos
+    # whose cached transcript is marked as not yet applied (by this run's check or an earlier one
+    # that was not waited for), and new pages whose check finished after they were created.
+    # A video is marked as applied only once all of its pages were updated.
+    pages_transcripts_updated = 0
+    if SYNC_TRANSCRIPTS:
+        outdated_video_ids = set()
+        failed_video_ids = set()
+        for placement_index, (video, chapter_id, destination) in enumerate(placements):
             video_id = video['id']
-            total_videos_processed += 1
-            
-            # Check for duplication
-            if video_id in existing_pages_map:
-                pages_skipped += 1
-                print(f"    Skipping: Video ID {video_id} is already present in BookStack (Page ID: {existing_pages_map[video_id]}).")
+            page_id = placement_page_ids.get(placement_index)
+            if page_id is None:
                 continue
-                
-            # Create page with chapter_id=None
-            # NOTE: Pages created without a chapter_id will be placed at the root of the book.
-            created = create_bookstack_page(video, book_id, chapter_id=None)
-            
-            if created:
-                pages_created += 1
-                
+            if video_id in transcript_futures:
+                wait_for_transcript(transcript_futures, video_id)
+            cached_transcript = load_cached_transcript(video_id)
+            if not cached_transcript:
+                continue
+            if cached_transcript.get('pages_outdated'):
+                outdated_video_ids.add(video_id)
+            if page_id in created_page_transcripts:
+                needs_update = created_page_transcripts[page_id] != cached_transcript['html']
+            else:
+                needs_update = cached_transcript.get('pages_outdated')
+            if not needs_update:
+                continue
+
+            if update_bookstack_page(page_id, video, book_id, chapter_id, cached_transcript['html']):
+                pages_transcripts_updated += 1
+            else:
+                failed_video_ids.add(video_id)
             time.sleep(API_DELAY_SECONDS)
 
+        for video_id in outdated_video_ids - failed_video_ids:
+            mark_transcript_applied(video_id)
+
+    if transcript_executor is not None:
+        transcript_executor.shutdown(wait=False, cancel_futures=True)
+
+    # 5c. Mirror playlist order in each chapter (only out-of-place pages are updated)
+    pages_reordered = 0
+    if SYNC_PAGE_ORDER:
+        RUN_METRICS.begin_phase('page_order')
+        print("\n--- Syncing Page Order Within Chapters ---")
+        chapter_page_orders = {}
+        for placement_index, (video, chapter_id, destination) in enumerate(placements):
+            if chapter_id is not None and placement_index in placement_page_ids:
+                chapter_page_orders.setdefault(chapter_id, []).append(placement_page_ids[placement_index])
+        pages_reordered = sync_chapter_page_order(book_id, chapter_page_orders)
+
+    # Persist the uploads watermark only once the pages for this run have been processed.
+    # If a page for an upload newer than the previous watermark failed, the watermark is not
+    # advanced, so the next run fetches that upload again instead of skipping it.
+    if sync_state is not None:
+        failed_new_uploads = [
+            video for video in failed_videos
+            if not previous_watermark or video['snippet']['publishedAt'] > previous_watermark['published_at']
+        ]
+        if failed_new_uploads:
+            print(f"\nWARNING: {len(failed_new_uploads)} new upload(s) could not be synced. Keeping the previous uploads watermark so they are retried.")
+            if previous_watermark:
+                sync_state['uploads_watermark'] = previous_watermark
+            else:
+                sync_state.pop('uploads_watermark', None)
+        save_sync_state(sync_state)
+
     # 6. Final Summary
     print("\n--- Sync Complete ---")
     print(f"Total YouTube videos processed: {total_videos_processed}")
@@ -804,10 +2391,541 @@ def run_sync():
         print(f"Total existing pages permanently deleted: {pages_deleted}")
         print(f"Total existing chapters deleted: {chapters_deleted}")
     print(f"New chapters created: {chapters_created}")
+    print(f"Chapters renamed to match their playlist: {chapters_renamed}")
     print(f"New pages created: {pages_created}")
+    print(f"Existing pages moved between chapters: {pages_moved}")
+    if SYNC_PAGE_ORDER:
+        print(f"Pages repositioned to match playlist order: {pages_reordered}")
     if not FORCE_RESYNC:
         print(f"Videos skipped (already synced): {pages_skipped}")
-
+    if SYNC_TRANSCRIPTS:
+        print(f"Existing pages updated with changed transcripts: {pages_transcripts_updated}")
+
+    RUN_METRICS.items_processed = total_videos_processed
+    RUN_METRICS.counters.update({
+        'pages_deleted': pages_deleted,
+        'chapters_deleted': chapters_deleted,
+        'chapters_created': chapters_created,
+        'chapters_renamed': chapters_renamed,
+        'pages_created': pages_created,
+        'pages_moved': pages_moved,
+        'pages_reordered': pages_reordered,
+        'pages_skipped': pages_skipped,
+        'pages_transcripts_updated': pages_transcripts_updated,
+    })
+
+    RUN_METRICS.begin_phase('purge')
     run_purge_script()
+    return True
+
+# --- OVERLAPPING-RUN PROTECTION ---
+
+def is_process_running(pid):
+    """True if a process with this PID exists on this machine."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but owned by another user
+        return True
+    return True
+
+def read_sync_lock_holder():
+    """
+    Reads who last held the sync lock.
+    Returns: {'pid', 'hostname', 'started_at'} or None if unknown.
+    """
+    try:
+        with open(SYNC_LOCK_FILE, 'r') as lock_file:
+            return json.load(lock_file)
+    except (OSError, ValueError):
+        return None
+
+def acquire_sync_lock():
+    """
+    Takes the advisory sync lock without waiting. The lock is held by the open file,
+    so the operating system releases it if the holder dies; a lock file left behind
+    by a dead process is detected and reported as stale.
+    Returns: The open lock file (pass it to release_sync_lock()), or None if another run holds the lock.
+    """
+    lock_file = open(SYNC_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        holder = read_sync_lock_holder()
+        if holder:
+            running_hours = (time.time() - holder.get('started_at', time.time())) / 3600
+            print(f"-> Another sync is running (PID {holder.get('pid')} on {holder.get('hostname')}, started {running_hours:.1f} hours ago).")
+            if running_hours > SYNC_LOCK_WARN_HOURS:
+                print(f"WARNING: The running sync has held the lock for over {SYNC_LOCK_WARN_HOURS} hours. It may be stuck.")
+        return None
+
+    previous_holder = read_sync_lock_holder()
+    if previous_holder and previous_holder.get('hostname') == socket.gethostname() \
+            and not is_process_running(previous_holder.get('pid', 0)):
+        print(f"-> Recovered stale sync lock left by PID {previous_holder.get('pid')} (process no longer running).")
+
+    lock_file.seek(0)
+    lock_file.truncate()
+    json.dump({'pid': os.getpid(), 'hostname': socket.gethostname(), 'started_at': time.time()}, lock_file)
+    lock_file.flush()
+    return lock_file
+
+def release_sync_lock(lock_file):
+    """Releases the sync lock taken by acquire_sync_lock()."""
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.flush()
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+def mark_sync_dirty():
+    """Records that a sync was requested while another run held the lock."""
+    try:
+        with open(SYNC_DIRTY_FILE, 'w') as dirty_file:
+            dirty_file.write(str(time.time()))
+    except OSError as e:
+        print(f"WARNING: Could not record the sync request in {SYNC_DIRTY_FILE}: {e}")
+
+def consume_sync_dirty_flag():
+    """
+    Clears the dirty flag.
+    Returns: True if a sync had been requested since the flag was last cleared.
+    """
+    try:
+        os.remove(SYNC_DIRTY_FILE)
+        return True
+    except FileNotFoundError:
+        return False
+
+def run_follow_up_cycles(from_mirror=False):
+    """
+    Runs up to SYNC_MAX_FOLLOW_UP_CYCLES full sync cycles while sync requests that
+    arrived during the previous cycle are pending. The caller must hold the lock.
+    """
+    follow_up_cycles = 0
+    while follow_up_cycles < SYNC_MAX_FOLLOW_UP_CYCLES and consume_sync_dirty_flag():
+        follow_up_cycles += 1
+        print("\n-> Another sync was requested while this one was running. Starting a follow-up cycle...")
+        run_sync(from_mirror)
+
+def run_sync_exclusive(from_mirror=False):
+    """
+    Runs run_sync() under the single-instance lock. If another run holds the lock,
+    this run only marks the sync as dirty and exits. The run holding the lock checks
+    the flag when it finishes and runs up to SYNC_MAX_FOLLOW_UP_CYCLES follow-up
+    cycles, so any number of overlapping requests collapse into one. A request that
+    arrives after the last check keeps the flag set for the next scheduled run.
+    """
+    lock_file = acquire_sync_lock()
+    if lock_file is None:
+        mark_sync_dirty()
+        print("-> Sync request recorded. The running sync will do a follow-up cycle when it finishes.")
+        return
+
+    try:
+        # This cycle covers every request made before it started
+        consume_sync_dirty_flag()
+        run_sync(from_mirror)
+        run_follow_up_cycles(from_mirror)
+    finally:
+        release_sync_lock(lock_file)
+
+# --- RUN HISTORY ---
+
+def open_run_history_db():
+    """Opens (and if needed creates) the run history database."""
+    connection = sqlite3.connect(RUN_HISTORY_DB)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            duration_seconds REAL NOT NULL,
+            status TEXT NOT NULL,
+            items_processed INTEGER NOT NULL,
+            error_count INTEGER NOT NULL,
+            phase_seconds TEXT NOT NULL,
+            request_counts TEXT NOT NULL,
+            request_seconds TEXT NOT NULL,
+            counters TEXT NOT NULL
+        )
+    """)
+    return connection
+
+def load_run_history(connection):
+    """
+    Reads every recorded run, oldest first.
+    Returns: list of run dictionaries (JSON columns decoded, per-item cost added).
+    """
+    runs = []
+    for row in connection.execute("""
+            SELECT id, started_at, duration_seconds, status, items_processed, error_count,
+                   phase_seconds, request_counts, request_seconds, counters
+            FROM runs ORDER BY id"""):
+        run = {
+            'id': row[0],
+            'started_at': row[1],
+            'duration_seconds': row[2],
+            'status': row[3],
+            'items_processed': row[4],
+            'error_count': row[5],
+            'phase_seconds': json.loads(row[6]),
+            'request_counts': json.loads(row[7]),
+            'request_seconds': json.loads(row[8]),
+            'counters': json.loads(row[9]),
+        }
+        run['per_item_seconds'] = run['duration_seconds'] / run['items_processed'] if run['items_processed'] else None
+        runs.append(run)
+    return runs
+
+def get_per_item_baseline(previous_runs):
+    """
+    Rolling baseline: the median per-item cost of the last HISTORY_BASELINE_RUNS
+    successful runs that processed at least one item.
+    Returns: seconds per item, or None if there is no usable history yet.
+    """
+    costs = [run['per_item_seconds'] for run in previous_runs if run['status'] == 'ok' and run['per_item_seconds']]
+    costs = costs[-HISTORY_BASELINE_RUNS:]
+    return statistics.median(costs) if costs else None
+
+def is_performance_regression(run, baseline):
+    """True if the run's per-item cost is well above the rolling baseline."""
+    return bool(baseline and run['per_item_seconds'] and run['per_item_seconds'] > baseline * HISTORY_REGRESSION_FACTOR)
+
+def record_run_history(metrics, status):
+    """
+    Adds the run to the history database and warns if its per-item cost is
+    well above the rolling baseline of previous runs.
+    """
+    duration_seconds = time.time() - metrics.started_at
+    try:
+        connection = open_run_history_db()
+        with connection:
+            connection.execute(
+                """INSERT INTO runs (started_at, duration_seconds, status, items_processed, error_count,
+                                     phase_seconds, request_counts, request_seconds, counters)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    metrics.started_at,
+                    duration_seconds,
+                    status,
+                    metrics.items_processed,
+                    metrics.error_count,
+                    json.dumps(metrics.phase_seconds),
+                    json.dumps(metrics.request_counts),
+                    json.dumps(metrics.request_seconds),
+                    json.dumps(metrics.counters),
+                )
+            )
+        runs = load_run_history(connection)
+        connection.close()
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not record run history in {RUN_HISTORY_DB}: {e}")
+        return
+
+    this_run = runs[-1]
+    total_requests = sum(metrics.request_counts.values())
+    print(f"\nRun recorded in history: {duration_seconds:.1f}s, {metrics.items_processed} items, "
+          f"{total_requests} API requests, {metrics.error_count} errors.")
+
+    baseline = get_per_item_baseline(runs[:-1])
+    if is_performance_regression(this_run, baseline):
+        print(f"WARNING: Possible performance regression. This run took {this_run['per_item_seconds'] * 1000:.0f} ms per item, "
+              f"{this_run['per_item_seconds'] / baseline:.1f}x the recent baseline of {baseline * 1000:.0f} ms per item.")
+
+def format_trend(recent_values, earlier_values):
+    """Formats the change between the medians of two windows of values."""
+    if not recent_values or not earlier_values:
+        return "n/a"
+    recent = statistics.median(recent_values)
+    earlier = statistics.median(earlier_values)
+    if earlier == 0:
+        return f"{earlier:.2f} -> {recent:.2f}"
+    return f"{earlier:.2f} -> {recent:.2f} ({(recent - earlier) / earlier * 100:+.0f}%)"
+
+def show_run_history(limit=20):
+    """
+    Prints the most recent runs with their per-item cost, flags runs that were well
+    above the rolling baseline, and compares the latest HISTORY_BASELINE_RUNS runs with
+    the ones before them to show whether the channel grew or BookStack got slower.
+    """
+    if not os.path.exists(RUN_HISTORY_DB):
+        print(f"No run history found ({RUN_HISTORY_DB} does not exist yet).")
+        return
+
+    try:
+        connection = open_run_history_db()
+        runs = load_run_history(connection)
+        connection.close()
+    except sqlite3.Error as e:
+        print(f"ERROR: Could not read run history from {RUN_HISTORY_DB}: {e}")
+        return
+
+    if not runs:
+        print("No runs recorded yet.")
+        return
+
+    print(f"--- Sync Run History (last {min(limit, len(runs))} of {len(runs)} runs) ---")
+    print(f"{'Run':>5}  {'Started':<16} {'Status':<8} {'Duration':>9} {'Items':>6} {'ms/item':>8} "
+          f"{'BookStack req':>13} {'ms/req':>7} {'YouTube req':>11} {'Errors':>6}")
+
+    for index in range(max(0, len(runs) - limit), len(runs)):
+        run = runs[index]
+        bookstack_requests = sum(count for key, count in run['request_counts'].items() if key.startswith('bookstack '))
+        youtube_requests = sum(count for key, count in run['request_counts'].items() if key.startswith('youtube '))
+        bookstack_ms = run['request_seconds'].get('bookstack', 0) * 1000 / bookstack_requests if bookstack_requests else 0
+        per_item_ms = f"{run['per_item_seconds'] * 1000:.0f}" if run['per_item_seconds'] else "-"
+        flag = "  <-- SLOW" if is_performance_regression(run, get_per_item_baseline(runs[:index])) else ""
+
+        print(f"{run['id']:>5}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started_at'])):<16} "
+              f"{run['status']:<8} {run['duration_seconds']:>8.1f}s {run['items_processed']:>6} {per_item_ms:>8} "
+              f"{bookstack_requests:>13} {bookstack_ms:>7.0f} {youtube_requests:>11} {run['error_count']:>6}{flag}")
+
+    # Trends: median of the latest window compared with the window before it
+    successful_runs = [run for run in runs if run['status'] == 'ok']
+    recent_runs = successful_runs[-HISTORY_BASELINE_RUNS:]
+    earlier_runs = successful_runs[-2 * HISTORY_BASELINE_RUNS:-HISTORY_BASELINE_RUNS]
+    if not earlier_runs:
+        print(f"\nTrends need more than {HISTORY_BASELINE_RUNS} successful runs.")
+        return
+
+    def bookstack_ms_per_request(run):
+        count = sum(c for key, c in run['request_counts'].items() if key.startswith('bookstack '))
+        return run['request_seconds'].get('bookstack', 0) * 1000 / count if count else 0
+
+    print(f"\n--- Trends (median of last {len(recent_runs)} successful runs vs the {len(earlier_runs)} before) ---")
+    trend_rows = [
+        ("Duration (s)", [r['duration_seconds'] for r in recent_runs], [r['duration_seconds'] for r in earlier_runs]),
+        ("Items processed", [r['items_processed'] for r in recent_runs], [r['items_processed'] for r in earlier_runs]),
+        ("Cost per item (ms)",
+         [r['per_item_seconds'] * 1000 for r in recent_runs if r['per_item_seconds']],
+         [r['per_item_seconds'] * 1000 for r in earlier_runs if r['per_item_seconds']]),
+        ("BookStack ms per request", [bookstack_ms_per_request(r) for r in recent_runs], [bookstack_ms_per_request(r) for r in earlier_runs]),
+    ]
+
+    phase_names = sorted({name for run in recent_runs + earlier_runs for name in run['phase_seconds']})
+    for phase_name in phase_names:
+        trend_rows.append((
+            f"Phase '{phase_name}' (s)",
+            [r['phase_seconds'][phase_name] for r in recent_runs if phase_name in r['phase_seconds']],
+            [r['phase_seconds'][phase_name] for r in earlier_runs if phase_name in r['phase_seconds']],
+        ))
+
+    for label, recent_values, earlier_values in trend_rows:
+        print(f"  {label + ':':<30} {format_trend(recent_values, earlier_values)}")
+
+# --- WEBSUB PUSH NOTIFICATIONS ---
+
+# Notifications received by the HTTP server, consumed by the sync worker
+WEBSUB_NOTIFICATION_QUEUE = queue.Queue()
+
+# XML namespaces used by YouTube's Atom push notifications
+ATOM_NAMESPACES = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'yt': 'http://www.youtube.com/xml/schemas/2015',
+    'at': 'http://purl.org/atompub/tombstones/1.0',
+}
+
+def get_websub_topic_url():
+    """Returns the YouTube feed URL that WebSub notifications are published for."""
+    return f"https://www.youtube.com/xml/feeds/videos.xml?channel_id={YOUTUBE_CHANNEL_ID}"
+
+def subscribe_to_websub_hub(mode='subscribe'):
+    """
+    Sends a (un)subscription request for the channel feed to the WebSub hub.
+    The hub confirms it asynchronously by calling WEBSUB_CALLBACK_URL.
+    Returns: True if the hub accepted the request.
+    """
+    payload = {
+        'hub.callback': WEBSUB_CALLBACK_URL,
+        'hub.topic': get_websub_topic_url(),
+        'hub.mode': mode,
+        'hub.verify': 'async',
+        'hub.lease_seconds': str(WEBSUB_LEASE_SECONDS),
+    }
+    if WEBSUB_SECRET:
+        payload['hub.secret'] = WEBSUB_SECRET
+
+    print(f"-> Sending WebSub '{mode}' request to {WEBSUB_HUB_URL}...")
+    try:
+        response = requests.post(WEBSUB_HUB_URL, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        print(f"  Hub accepted the request (HTTP {response.status_code}). Waiting for verification callback.")
+        return True
+    except requests.exceptions.RequestException as e:
+        http_status = e.response.status_code if e.response is not None else "Unknown"
+        error_details = e.response.text if e.response is not None else str(e)
+        print(f"  FAILED to {mode}. HTTP Error {http_status}: {error_details}")
+        return False
+
+def parse_websub_notification(body):
+    """
+    Parses an Atom push notification from YouTube. Entries for videos of any
+    channel other than YOUTUBE_CHANNEL_ID are ignored.
+    Returns: A tuple (list of updated/new video IDs, list of deleted video IDs)
+    """
+    updated_video_ids = []
+    deleted_video_ids = []
+
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError as e:
+        print(f"  WARNING: Ignoring malformed WebSub notification: {e}")
+        return updated_video_ids, deleted_video_ids
+
+    for entry in root.findall('atom:entry', ATOM_NAMESPACES):
+        video_id = entry.findtext('yt:videoId', default='', namespaces=ATOM_NAMESPACES).strip()
+        channel_id = entry.findtext('yt:channelId', default='', namespaces=ATOM_NAMESPACES).strip()
+        if not video_id:
+            continue
+        if channel_id != YOUTUBE_CHANNEL_ID:
+            print(f"  WARNING: Ignoring notification for video {video_id} from another channel ('{channel_id}').")
+            continue
+        updated_video_ids.append(video_id)
+
+    for deleted_entry in root.findall('at:deleted-entry', ATOM_NAMESPACES):
+        # The ref attribute has the form "yt:video:VIDEO_ID"
+        ref = deleted_entry.get('ref', '')
+        if ref.startswith('yt:video:'):
+            deleted_video_ids.append(ref[len('yt:video:'):])
+
+    return updated_video_ids, deleted_video_ids
+
+class WebSubRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler for the WebSub callback: answers the hub's verification
+    challenge (GET) and queues the videos named in notifications (POST).
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        mode = query.get('hub.mode', [''])[0]
+        topic = query.get('hub.topic', [''])[0]
+        challenge = query.get('hub.challenge', [''])[0]
+
+        if mode in ('subscribe', 'unsubscribe') and topic == get_websub_topic_url() and challenge:
+            print(f"  WebSub hub verified '{mode}' (lease: {query.get('hub.lease_seconds', ['n/a'])[0]} seconds).")
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.end_headers()
+            self.wfile.write(challenge.encode('utf-8'))
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        # Hubs expect a 2xx even for notifications we choose to ignore
+        self.send_response(204)
+        self.end_headers()
+
+        if WEBSUB_SECRET:
+            expected_signature = 'sha1=' + hmac.new(WEBSUB_SECRET.encode('utf-8'), body, hashlib.sha1).hexdigest()
+            if not hmac.compare_digest(expected_signature, self.headers.get('X-Hub-Signature', '')):
+                print("  WARNING: Ignoring WebSub notification with an invalid signature.")
+                return
+
+        updated_video_ids, deleted_video_ids = parse_websub_notification(body)
+        for video_id in updated_video_ids:
+            WEBSUB_NOTIFICATION_QUEUE.put(video_id)
+        if updated_video_ids:
+            print(f"  WebSub notification received for video(s): {', '.join(updated_video_ids)}")
+        if deleted_video_ids:
+            print(f"  WebSub deletion notice for video(s) {', '.join(deleted_video_ids)}. Left for the next full sync.")
+
+    def log_message(self, format, *args):
+        # Request logging is replaced by the messages above
+        pass
+
+def run_websub_receiver():
+    """
+    Runs the push-notification receiver: serves the WebSub callback, subscribes
+    to the channel feed (renewing before the lease expires), and runs a targeted
+    sync for the videos named in incoming notifications. Bursts of notifications
+    are coalesced for WEBSUB_DEBOUNCE_SECONDS so each video is synced once.
+    Targeted syncs take the same lock as full syncs and wait for a running one.
+    """
+    print("--- YouTube WebSub Push Notification Receiver ---")
+
+    if not WEBSUB_CALLBACK_URL:
+        print("Receiver stopped: WEBSUB_CALLBACK_URL is not set. It must be reachable by the hub.")
+        return
+
+    # Without a secret anyone who can reach the listener could trigger syncs
+    if not WEBSUB_SECRET:
+        print("Receiver stopped: WEBSUB_SECRET is not set. Notifications could not be verified.")
+        return
+
+    server = ThreadingHTTPServer((WEBSUB_LISTEN_HOST, WEBSUB_LISTEN_PORT), WebSubRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"-> Listening for WebSub callbacks on {WEBSUB_LISTEN_HOST}:{WEBSUB_LISTEN_PORT}")
+
+    # Renew at 90% of the lease so the subscription never lapses
+    renew_interval = WEBSUB_LEASE_SECONDS * 0.9
+    next_renewal = 0
+
+    try:
+        while True:
+            if time.time() >= next_renewal:
+                # Retry sooner if the hub rejected the request
+                next_renewal = time.time() + (renew_interval if subscribe_to_websub_hub() else 300)
+
+            try:
+                first_video_id = WEBSUB_NOTIFICATION_QUEUE.get(timeout=max(1, next_renewal - time.time()))
+            except queue.Empty:
+                continue
+
+            # Coalesce: collect everything that arrives during the debounce window
+            pending_video_ids = [first_video_id]
+            time.sleep(WEBSUB_DEBOUNCE_SECONDS)
+            while True:
+                try:
+                    pending_video_ids.append(WEBSUB_NOTIFICATION_QUEUE.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Never write alongside a cron sync. Full syncs skip existing pages, so retry later
+            # rather than relying on the full sync to pick up metadata changes.
+            lock_file = acquire_sync_lock()
+            if lock_file is None:
+                print("-> Postponing targeted sync until the running sync finishes.")
+                for video_id in pending_video_ids:
+                    WEBSUB_NOTIFICATION_QUEUE.put(video_id)
+                continue
+
+            try:
+                sync_single_videos(list(dict.fromkeys(pending_video_ids)))
+                # A scheduled run that found the lock taken only left the dirty flag behind
+                run_follow_up_cycles()
+            finally:
+                release_sync_lock(lock_file)
+
+    except KeyboardInterrupt:
+        print("\n-> Shutting down WebSub receiver...")
+        subscribe_to_websub_hub(mode='unsubscribe')
+    finally:
+        server.shutdown()
+
+
 if __name__ == "__main__":
-    run_sync()
\ No newline at end of file
+    # Usage: python "Sync Public Videos.py" [sync-from-mirror|websub|history [N]]
+    #   (no argument)     Run a full sync (the cron job)
+    #   sync-from-mirror  Run a sync using the local YouTube mirror instead of the YouTube API
+    #   websub            Run the push-notification receiver for targeted single-video syncs
+    #   history [N]       Show the last N recorded runs (default 20), trends and slow runs
+    # The existing-page scan benchmark lives in "Benchmark Page Scan.py".
+    command = sys.argv[1] if len(sys.argv) > 1 else 'sync'
+    if command == 'sync-from-mirror':
+        run_sync_exclusive(from_mirror=True)
+    elif command == 'websub':
+        run_websub_receiver()
+    elif command == 'history':
+        if len(sys.argv) > 2 and not (sys.argv[2].isdigit() and int(sys.argv[2]) > 0):
+            print('Usage: python "Sync Public Videos.py" history [N]  (N: number of runs to show, a positive integer)')
+            sys.exit(1)
+        show_run_history(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+    else:
+        run_sync_exclusive()
\ No newline at end of file